@@ -3,7 +3,7 @@
 Backend Controller API for managing main.py process
 Provides endpoints for frontend to control the backend
 """
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
 from flask_cors import CORS
 import subprocess
 import os
@@ -16,6 +16,7 @@ import shutil
 from pathlib import Path
 import requests
 import threading
+from collections import deque
 
 app = Flask(__name__)
 CORS(app)
@@ -23,6 +24,24 @@ CORS(app)
 # Global variables (minimal controller)
 main_process = None
 
+# Event channel to main.py: the frontend posts mic clicks / confirmations and
+# main.py blocks on /api/backend/events until one arrives (long-poll, no status polling)
+EVENT_LOG_SIZE = 100
+LONG_POLL_SECONDS = 25
+events = deque(maxlen=EVENT_LOG_SIZE)
+event_seq = 0
+events_cond = threading.Condition()
+backend_state = {"voice_command_requested": False, "recognized_command": None, "command_confirmed": None}
+
+def push_event(kind: str, data: dict = None) -> int:
+    """Record an event and wake every waiting long-poll."""
+    global event_seq
+    with events_cond:
+        event_seq += 1
+        events.append({"seq": event_seq, "type": kind, "data": data or {}})
+        events_cond.notify_all()
+        return event_seq
+
 def ensure_preview_server(port: int = 8000) -> bool:
     """Ensure the live preview server (backend/server.py) is running."""
     # First check if it's already running
@@ -68,7 +87,49 @@ def ensure_preview_server(port: int = 8000) -> bool:
 def get_backend_status():
     """Minimal status response used during reset"""
     running = bool(main_process and main_process.poll() is None)
-    return jsonify({"running": running})
+    return jsonify({"running": running, "seq": event_seq, **backend_state})
+
+@app.route('/api/backend/events', methods=['GET'])
+def wait_for_events():
+    """Long-poll for main.py: returns events newer than ?since= as soon as one exists,
+    or an empty list after ?timeout= seconds. Without since it answers at once with the current seq."""
+    since = request.args.get('since', type=int)
+    timeout = min(request.args.get('timeout', default=LONG_POLL_SECONDS, type=float), 60)
+    with events_cond:
+        if since is None:
+            return jsonify({"events": [], "seq": event_seq})
+        if since > event_seq:
+            since = 0  # controller restarted; everything it has is new
+        events_cond.wait_for(lambda: event_seq > since, timeout=timeout)
+        pending = [e for e in events if e["seq"] > since]
+        return jsonify({"events": pending, "seq": event_seq})
+
+@app.route('/api/backend/request-voice-command', methods=['POST'])
+def request_voice_command():
+    """Microphone button clicked in the frontend."""
+    backend_state["voice_command_requested"] = True
+    return jsonify({"success": True, "seq": push_event("voice_command_requested")})
+
+@app.route('/api/backend/set-recognized-command', methods=['POST'])
+def set_recognized_command():
+    """main.py reports what it heard; the frontend shows it for confirmation."""
+    command = (request.get_json(silent=True) or {}).get("command")
+    backend_state.update({"voice_command_requested": False, "recognized_command": command, "command_confirmed": None})
+    return jsonify({"success": True, "seq": push_event("recognized_command", {"command": command})})
+
+@app.route('/api/backend/confirm-command', methods=['POST'])
+def confirm_command():
+    """Frontend accepts or rejects the recognized command."""
+    confirmed = bool((request.get_json(silent=True) or {}).get("confirmed"))
+    backend_state.update({"recognized_command": None, "command_confirmed": confirmed})
+    return jsonify({"success": True, "seq": push_event("command_confirmed", {"confirmed": confirmed})})
+
+@app.route('/api/backend/update-status', methods=['POST'])
+def update_status():
+    """Merge status fields sent by main.py (e.g. clearing a flag)."""
+    fields = request.get_json(silent=True) or {}
+    backend_state.update({k: v for k, v in fields.items() if k in backend_state})
+    return jsonify({"success": True, **backend_state})
 
 @app.route('/api/backend/start', methods=['POST'])
 def start_backend():
@@ -115,6 +176,7 @@ def stop_backend():
     global main_process
     
     if main_process and main_process.poll() is None:
+        push_event("stop")
         try:
             main_process.terminate()
             main_process.wait(timeout=5)
@@ -9,19 +9,30 @@ import sys
 import json
 import time
 import signal
+import queue
 import threading
 from pathlib import Path
 from typing import Dict, Optional
 import tempfile
 import shutil
 
-from flask import Flask, request, jsonify, send_file, render_template_string
+from flask import Flask, Response, request, jsonify, send_file, render_template_string
 from flask_cors import CORS
 import openpyxl
 from openpyxl.utils import get_column_letter
 
 # Global variables for session management
 sessions: Dict[str, Dict] = {}
+sessions_lock = threading.RLock()
+# Sessions idle longer than the TTL are removed (with their file) by a background
+# reaper; above MAX_SESSIONS the least recently used ones go first
+SESSION_TTL_SECONDS = 2 * 60 * 60
+MAX_SESSIONS = 100
+REAP_INTERVAL_SECONDS = 60
+# Open Server-Sent Events streams: session id -> one queue per preview page
+subscribers: Dict[str, list] = {}
+subscribers_lock = threading.Lock()
+HEARTBEAT_SECONDS = 15
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
@@ -161,8 +172,6 @@ PREVIEW_TEMPLATE = """
     </div>
 
     <script>
-        let refreshInterval;
-        
         function refreshData() {
             const statusEl = document.getElementById('status');
             const refreshBtn = document.querySelector('.refresh-btn');
@@ -197,27 +206,62 @@ PREVIEW_TEMPLATE = """
                 });
         }
         
-        // Auto-refresh every 5 seconds
-        function startAutoRefresh() {
-            refreshInterval = setInterval(refreshData, 5000);
-        }
-        
-        // Stop auto-refresh when page is hidden
-        document.addEventListener('visibilitychange', function() {
-            if (document.hidden) {
-                clearInterval(refreshInterval);
-            } else {
-                startAutoRefresh();
-            }
-        });
-        
-        // Start auto-refresh
-        startAutoRefresh();
+        // Refresh only when the server says the file changed (no polling)
+        const events = new EventSource('/api/session/events?sessionId={{ session_id }}');
+        events.addEventListener('updated', refreshData);
     </script>
 </body>
 </html>
 """
 
+def notify_session(session_id: str, event: str, data: dict):
+    """Push an event to every preview page open for this session."""
+    message = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    with subscribers_lock:
+        for q in subscribers.get(session_id, []):
+            q.put(message)
+
+def get_session(session_id: str) -> Optional[Dict]:
+    """Look up a session and mark it as used (None if it doesn't exist)."""
+    with sessions_lock:
+        session = sessions.get(session_id) if session_id else None
+        if session is not None:
+            session['last_seen'] = time.time()
+        return session
+
+def remove_session(session_id: str) -> bool:
+    """Forget a session and delete its uploaded file."""
+    with sessions_lock:
+        session = sessions.pop(session_id, None)
+    if session is None:
+        return False
+    if session['file_path'] and os.path.exists(session['file_path']):
+        try:
+            os.remove(session['file_path'])
+        except OSError:
+            pass
+    return True
+
+def reap_sessions() -> int:
+    """Remove sessions idle past the TTL, then the least recently used ones over MAX_SESSIONS."""
+    now = time.time()
+    with sessions_lock:
+        by_age = sorted(sessions, key=lambda sid: sessions[sid]['last_seen'])
+        expired = [sid for sid in by_age if now - sessions[sid]['last_seen'] > SESSION_TTL_SECONDS]
+        live = by_age[len(expired):]
+        expired += live[:max(0, len(live) - MAX_SESSIONS)]
+    for session_id in expired:
+        remove_session(session_id)
+    return len(expired)
+
+def reaper_loop():
+    while True:
+        time.sleep(REAP_INTERVAL_SECONDS)
+        try:
+            reap_sessions()
+        except Exception as e:
+            print(f"Session reaper failed: {e}")
+
 def excel_to_html(file_path: str) -> str:
     """Convert Excel file to HTML table."""
     try:
@@ -265,18 +309,23 @@ def session_status():
 def start_session():
     """Start a new preview session."""
     session_id = f"session_{int(time.time())}"
-    sessions[session_id] = {
-        'created_at': time.time(),
-        'file_path': None,
-        'last_updated': None
-    }
+    with sessions_lock:
+        sessions[session_id] = {
+            'created_at': time.time(),
+            'last_seen': time.time(),
+            'file_path': None,
+            'last_updated': None
+        }
+    if len(sessions) > MAX_SESSIONS:
+        reap_sessions()
     return jsonify({"sessionId": session_id})
 
 @app.route('/api/session/upload', methods=['POST'])
 def upload_file():
     """Upload Excel file to session."""
     session_id = request.args.get('sessionId')
-    if not session_id or session_id not in sessions:
+    session = get_session(session_id)
+    if session is None:
         return jsonify({"error": "Invalid session ID"}), 400
     
     if 'file' not in request.files:
@@ -292,9 +341,18 @@ def upload_file():
     file_path = temp_dir / f"{session_id}_{file.filename}"
     file.save(file_path)
     
+    # Replace (not accumulate) the session's file
+    old_path = session['file_path']
+    if old_path and old_path != str(file_path) and os.path.exists(old_path):
+        try:
+            os.remove(old_path)
+        except OSError:
+            pass
+    
     # Update session
-    sessions[session_id]['file_path'] = str(file_path)
-    sessions[session_id]['last_updated'] = time.time()
+    session['file_path'] = str(file_path)
+    session['last_updated'] = time.time()
+    notify_session(session_id, 'updated', {"filename": file.filename})
     
     return jsonify({"success": True, "message": "File uploaded successfully"})
 
@@ -302,10 +360,10 @@ def upload_file():
 def refresh_session():
     """Refresh session data."""
     session_id = request.args.get('sessionId')
-    if not session_id or session_id not in sessions:
+    session = get_session(session_id)
+    if session is None:
         return jsonify({"error": "Invalid session ID"}), 400
     
-    session = sessions[session_id]
     if not session['file_path'] or not os.path.exists(session['file_path']):
         return jsonify({"error": "No file available"}), 400
     
@@ -322,14 +380,42 @@ def refresh_session():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/session/events')
+def session_events():
+    """Server-Sent Events stream: 'updated' whenever a new file is uploaded to the session."""
+    session_id = request.args.get('sessionId')
+    if get_session(session_id) is None:
+        return jsonify({"error": "Invalid session ID"}), 400
+
+    q = queue.Queue()
+    with subscribers_lock:
+        subscribers.setdefault(session_id, []).append(q)
+
+    def stream():
+        try:
+            yield "retry: 3000\n\n"  # sent right away so the browser sees the stream open
+            # An open preview keeps its session from expiring
+            while get_session(session_id) is not None:
+                try:
+                    yield q.get(timeout=HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+        finally:
+            with subscribers_lock:
+                subscribers.get(session_id, []).remove(q)
+                if not subscribers.get(session_id):
+                    subscribers.pop(session_id, None)
+
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
 @app.route('/api/session/preview')
 def preview_session():
     """Serve the preview page."""
     session_id = request.args.get('sessionId')
-    if not session_id or session_id not in sessions:
+    session = get_session(session_id)
+    if session is None:
         return "Invalid session ID", 400
     
-    session = sessions[session_id]
     filename = "No file" if not session['file_path'] else os.path.basename(session['file_path'])
     
     # Get current content
@@ -352,14 +438,7 @@ def preview_session():
 def cleanup_session():
     """Clean up session and files."""
     session_id = request.args.get('sessionId')
-    if session_id and session_id in sessions:
-        session = sessions[session_id]
-        if session['file_path'] and os.path.exists(session['file_path']):
-            try:
-                os.remove(session['file_path'])
-            except:
-                pass
-        del sessions[session_id]
+    if session_id and remove_session(session_id):
         return jsonify({"success": True})
     return jsonify({"error": "Session not found"}), 404
 
@@ -371,7 +450,8 @@ def cleanup_all_sessions():
             shutil.rmtree(temp_dir)
         except:
             pass
-    sessions.clear()
+    with sessions_lock:
+        sessions.clear()
 
 def signal_handler(signum, frame):
     """Handle shutdown signals."""
@@ -386,6 +466,7 @@ if __name__ == "__main__":
     
     # Clean up on startup
     cleanup_all_sessions()
+    threading.Thread(target=reaper_loop, name="session-reaper", daemon=True).start()
     
     print("Starting Live Preview Server...")
     print("Server will be available at: http://127.0.0.1:8000")
@@ -12,6 +12,13 @@ const LIVE_PREVIEW_BASE = "http://127.0.0.1:8000";
 // Voice controller is merged into the same server (8000)
 const VOICE_BACKEND_BASE = LIVE_PREVIEW_BASE;
 
+// Progress messages for /api/voice/command job stages
+const VOICE_STAGE_TEXT: Record<string, string> = {
+  speaker: "👤 Identifying speaker...",
+  listening: "🗣️ Say your command...",
+  executing: "⚙️ Executing command...",
+};
+
 interface Student {
   name: string;
   dsa: string;
@@ -232,7 +239,7 @@ const Demo = () => {
       const resp = await fetch(`${VOICE_BACKEND_BASE}/api/voice/text`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ text })
+        body: JSON.stringify({ text, sessionId })
       });
       const data = await resp.json();
 
@@ -270,13 +277,33 @@ const Demo = () => {
     setIsListening(true);
     setMessages(prev => [...prev, { type: "system", text: "🎧 Listening for voice...", timestamp: new Date() }]);
     try {
-      const resp = await fetch(`${VOICE_BACKEND_BASE}/api/voice/command`, { method: "POST" });
-      const data = await resp.json();
+      // Start the command as a job, then follow its stages until it finishes
+      const start = await fetch(`${VOICE_BACKEND_BASE}/api/voice/command?wait=0&sessionId=${encodeURIComponent(sessionId)}`, { method: "POST" });
+      const job = await start.json();
+      if (!start.ok) {
+        setMessages(prev => [...prev, { type: "system", text: `❌ ${job?.error || "Voice command failed"}`, timestamp: new Date() }]);
+        return;
+      }
 
-      if (!resp.ok) {
-        setMessages(prev => [...prev, { type: "system", text: `❌ ${data?.error || "Voice command failed"}`, timestamp: new Date() }]);
+      let status: any = null;
+      let lastStage = "";
+      while (true) {
+        await new Promise(resolve => setTimeout(resolve, 500));
+        const poll = await fetch(`${VOICE_BACKEND_BASE}/api/jobs/${job.jobId}`);
+        status = await poll.json();
+        const stage = status?.progress?.stage;
+        if (stage && stage !== lastStage && VOICE_STAGE_TEXT[stage]) {
+          lastStage = stage;
+          setMessages(prev => [...prev, { type: "system", text: VOICE_STAGE_TEXT[stage], timestamp: new Date() }]);
+        }
+        if (!poll.ok || status?.state === "done" || status?.state === "error") break;
+      }
+
+      if (status?.state !== "done") {
+        setMessages(prev => [...prev, { type: "system", text: `❌ ${status?.error || "Voice command failed"}`, timestamp: new Date() }]);
         return;
       }
+      const data = status.result;
 
       if (data?.transcript) {
         setMessages(prev => [...prev, { type: "user", text: data.transcript, timestamp: new Date() }]);
@@ -2,11 +2,16 @@
 © 2025 Shreyas | Student of Sathyabama Institute of Science and Technology
 
 import os
+import re
+import json
+import shutil
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, Optional, Any
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 
 # Ensure parent directory (Current/) is importable when running from backend/
@@ -26,10 +31,18 @@ from module_voice_input import (
 )
 VOICE_SOURCE = "module_voice_input (no-whisper)"
 
-from module_speaker_id import ensure_known_speaker
+from module_speaker_id import ensure_known_speaker, encoder_status, start_encoder_warmup
 from module_parse_command import parse_command, set_speak_function
 from module_excel_handler import ExcelHandler
+from module_sheet_reader import snapshot_cache
+from module_change_events import ChangeBroker, format_event
+from module_blob_store import BlobStore, same_file
+from module_session_manager import SessionManager
+from module_handler_registry import HandlerRegistry
+from module_command_queue import JobTable, new_job_id
+from module_batch_commands import MAX_BATCH_LINES, run_batch
 import openpyxl
+from openpyxl.utils import column_index_from_string
 from tkinter import Tk, filedialog
 
 
@@ -39,13 +52,33 @@ CORS(app)
 UPLOAD_ROOT = Path(__file__).parent / "uploads"
 UPLOAD_ROOT.mkdir(parents=True, exist_ok=True)
 
-sessions: Dict[str, Dict] = {}
+# Uploads and history snapshots are hardlinks into one content-addressed store,
+# so identical workbooks take disk space once
+blob_store = BlobStore(UPLOAD_ROOT / ".blobs")
+
+# History retention per session: newest HISTORY_KEEP snapshots, none older than
+# HISTORY_MAX_AGE_DAYS (None disables either limit)
+HISTORY_KEEP = 20
+HISTORY_MAX_AGE_DAYS = 30
+HISTORY_STAMP = re.compile(r"_saved_(\d{8}-\d{6}(?:-\d{6})?)_")
+
+# /api/session/table paging limits
+DEFAULT_PAGE_ROWS = 200
+DEFAULT_PAGE_COLS = 50
+MAX_PAGE_ROWS = 1000
+MAX_PAGE_COLS = 200
+
+# Idle sessions expire (and their uploads are deleted) after SESSION_TTL_SECONDS;
+# beyond MAX_SESSIONS the least recently used one goes first
+sessions = SessionManager()
+
+# Server-Sent Events fan-out, keyed by session id
+change_broker = ChangeBroker()
 
 # --- Global state for voice workflow ---
-excel_instance: Optional[ExcelHandler] = None
-sheet_selected: bool = False
 device_index: Optional[int] = None
-LATEST_FILE: Optional[Path] = None
+# Session that uploaded most recently; used by voice/text requests that don't send a sessionId
+latest_session_id: Optional[str] = None
 
 
 def speak(text: str):
@@ -55,20 +88,47 @@ def speak(text: str):
 set_speak_function(speak)
 
 
-def ensure_excel_loaded() -> ExcelHandler:
-    global excel_instance, sheet_selected
-    global LATEST_FILE
-    if LATEST_FILE is None:
+def open_workbook(path: str) -> ExcelHandler:
+    """HandlerRegistry factory: load a workbook for the API (no GUI prompts)."""
+    excel = ExcelHandler(path)
+    excel.add_change_listener(publish_handler_change)
+    # Default to first sheet without any GUI prompt
+    if excel.wb.sheetnames:
+        excel.ws = excel.wb[excel.wb.sheetnames[0]]
+    return excel
+
+
+# Open workbooks, one per file; edits run on each workbook's single writer thread
+handlers = HandlerRegistry(factory=open_workbook)
+# Commands submitted with "wait": false, looked up via /api/jobs/<id>
+jobs = JobTable()
+# One microphone: voice commands record one at a time, off the request threads
+voice_jobs = ThreadPoolExecutor(max_workers=1, thread_name_prefix="voice")
+
+
+def command_session_id() -> str:
+    """Session a voice/text command applies to: ?sessionId= or a "sessionId" JSON field,
+    else the session that uploaded last (older frontends don't send one)."""
+    session_id = request.args.get("sessionId") or (request.get_json(silent=True) or {}).get("sessionId")
+    session_id = session_id or latest_session_id
+    if not session_id or session_id not in sessions:
         raise RuntimeError("No Excel file uploaded. Use the Upload button before using the mic.")
+    return session_id
+
 
-    # If no instance or different file, (re)load
-    if excel_instance is None or str(excel_instance.filename) != str(LATEST_FILE):
-        excel_instance = ExcelHandler(str(LATEST_FILE))
-        # Default to first sheet without any GUI prompt
-        if excel_instance.wb.sheetnames:
-            excel_instance.ws = excel_instance.wb[excel_instance.wb.sheetnames[0]]
-        sheet_selected = True
-    return excel_instance
+def request_waits() -> bool:
+    """False if the client asked for a job id instead of the result (?wait=0 or "wait": false)."""
+    if request.args.get("wait", "").lower() in ("0", "false", "no"):
+        return False
+    return (request.get_json(silent=True) or {}).get("wait") is not False
+
+
+def submit_command(session_id: str, command):
+    """Queue command(excel) on the writer thread of the session's workbook -> Future."""
+    last_file = sessions[session_id].get("last_file")
+    if not last_file or not os.path.exists(last_file):
+        raise RuntimeError("No Excel file uploaded. Use the Upload button before using the mic.")
+    return handlers.submit(last_file, session_id, command)
 
 
 def ensure_microphone_device() -> Optional[int]:
@@ -86,6 +146,228 @@ def ensure_microphone_device() -> Optional[int]:
     return device_index
 
 
+def live_handler(last_file: str) -> Optional[ExcelHandler]:
+    """The open ExcelHandler for this file, else None (reads never open a workbook)."""
+    return handlers.peek(last_file)
+
+
+def table_revision(last_file: str) -> str:
+    """Opaque revision of a session's workbook, also used as the table ETag.
+    "<epoch>.<n>" from the live handler's change counter, otherwise the file's mtime/size."""
+    excel = live_handler(last_file)
+    if excel is not None:
+        return f"{excel.epoch}.{excel.revision}"
+    st = os.stat(last_file)
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+
+def handler_changes(last_file: str, since: str):
+    """Cell changes (all sheets) after revision `since`, or None if only a full reload will do
+    (file not open in the live handler, another epoch, or the change log no longer reaches back)."""
+    excel = live_handler(last_file)
+    epoch, _, number = since.partition(".")
+    if excel is None or epoch != excel.epoch or not number.isdigit():
+        return None
+    return excel.changes_since(int(number))
+
+
+def table_changes(last_file: str, since: str, sheet: Optional[str]):
+    """handler_changes() narrowed to one sheet (the first sheet by default)."""
+    changes = handler_changes(last_file, since)
+    if changes is None:
+        return None
+    sheet_name = sheet or live_handler(last_file).wb.sheetnames[0]
+    return [change for change in changes if change["sheet"] == sheet_name]
+
+
+def client_changes(changes):
+    """Change dicts as sent to the browser (blank cells as "", like the table rows)."""
+    return [dict(c, old="" if c["old"] is None else c["old"], value="" if c["value"] is None else c["value"])
+            for c in changes]
+
+
+def sessions_for_file(path: str):
+    target = os.path.abspath(path)
+    return [sid for sid, data in list(sessions.items())
+            if data.get("last_file") and os.path.abspath(data["last_file"]) == target]
+
+
+def publish_handler_change(excel: ExcelHandler, change: Optional[Dict[str, Any]]):
+    """ExcelHandler change listener: push the edit to every session showing this workbook."""
+    revision = f"{excel.epoch}.{excel.revision}"
+    for session_id in sessions_for_file(str(excel.filename)):
+        if change is None:
+            change_broker.publish(session_id, "reload", {"revision": revision, "reason": "rows_shifted"}, revision)
+        else:
+            change_broker.publish(session_id, "cells",
+                                  {"revision": revision, "changes": client_changes([change])}, revision)
+
+
+def publish_reload(session_id: str, reason: str):
+    """Tell a session's open streams to fetch everything again (e.g. a new file was uploaded)."""
+    last_file = sessions[session_id].get("last_file")
+    revision = table_revision(last_file) if last_file and os.path.exists(last_file) else None
+    change_broker.publish(session_id, "reload", {"revision": revision, "reason": reason}, revision)
+
+
+def history_entries(hist_dir: Path):
+    """History snapshots newest first -> [(timestamp "YYYYmmdd-HHMMSS-micros", path), ...].
+    Older snapshots without a timestamp in the name fall back to their mtime."""
+    if not hist_dir.is_dir():
+        return []
+    entries = []
+    for path in hist_dir.iterdir():
+        if path.is_file():
+            match = HISTORY_STAMP.search(path.name)
+            stamp = match.group(1) if match else time.strftime("%Y%m%d-%H%M%S", time.localtime(path.stat().st_mtime))
+            entries.append((stamp, path))
+    entries.sort(reverse=True)
+    return entries
+
+
+def snapshot_history(hist_dir: Path, prev_path: str):
+    """Keep the outgoing working file in history (skipped if unchanged since the last snapshot)."""
+    prev_stem, prev_suf = os.path.splitext(os.path.basename(prev_path))
+    prev_suf = prev_suf or ".xlsx"
+    with blob_store.lock:  # no gc() between storing the blob and linking it
+        digest = blob_store.put_file(prev_path)
+        entries = history_entries(hist_dir)
+        if entries and same_file(str(entries[0][1]), blob_store.blob_path(digest, prev_suf)):
+            return entries[0][1]
+        now = time.time()
+        stamp = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now * 1e6) % 1000000:06d}"
+        name = f"{prev_stem}_saved_{stamp}_{digest[:8]}{prev_suf}"
+        return blob_store.link(digest, hist_dir / name, prev_suf)
+
+
+def prune_history(hist_dir: Path, keep: Optional[int] = HISTORY_KEEP,
+                  max_age_days: Optional[float] = HISTORY_MAX_AGE_DAYS):
+    """Apply the history retention policy -> removed paths (their blobs go once unreferenced)."""
+    cutoff = None
+    if max_age_days is not None:
+        cutoff = time.strftime("%Y%m%d-%H%M%S", time.localtime(time.time() - max_age_days * 86400))
+    removed = []
+    for i, (stamp, path) in enumerate(history_entries(hist_dir)):
+        if (keep is not None and i >= keep) or (cutoff is not None and stamp < cutoff):
+            blob_store.release(path)
+            removed.append(path)
+    return removed
+
+
+def cleanup_session(session_id: str, data: Dict):
+    """SessionManager eviction hook: release the workbook and delete the session's uploads.
+    Files opened in place via open-local are never deleted."""
+    global latest_session_id
+    handlers.release_session(session_id)
+    if latest_session_id == session_id:
+        latest_session_id = None
+    for path in set(data.get("files", []) + [data.get("last_file")]):
+        if path and not sessions_for_file(path):
+            snapshot_cache.discard(path)
+    session_dir = UPLOAD_ROOT / session_id
+    if session_dir.is_dir():
+        shutil.rmtree(session_dir, ignore_errors=True)
+        blob_store.gc()
+
+
+sessions.on_evict = cleanup_session
+
+
+def sweep_orphan_uploads(max_idle_seconds: Optional[float] = None):
+    """Delete upload folders left by earlier server runs (sessions live in memory only)
+    once nothing in them changed for the session TTL."""
+    if max_idle_seconds is None:
+        max_idle_seconds = sessions.ttl_seconds
+    cutoff = time.time() - max_idle_seconds
+    removed = 0
+    for session_dir in UPLOAD_ROOT.iterdir():
+        if not session_dir.is_dir() or session_dir.name.startswith(".") or session_dir.name in sessions:
+            continue
+        newest = max((p.stat().st_mtime for p in session_dir.rglob("*") if p.is_file()), default=0)
+        if newest < cutoff:
+            shutil.rmtree(session_dir, ignore_errors=True)
+            removed += 1
+    if removed:
+        blob_store.gc()
+    return removed
+
+
+def first_sheet_name(last_file: str) -> str:
+    excel = live_handler(last_file)
+    if excel is not None:
+        return excel.wb.sheetnames[0]
+    wb = openpyxl.load_workbook(last_file, read_only=True)
+    try:
+        return wb.sheetnames[0]
+    finally:
+        wb.close()
+
+
+def session_window(last_file: str, max_rows: int = 200, max_cols: int = 50):
+    """First-sheet window for the preview/table endpoints.
+    Served from the live ExcelHandler when it has this file open (so a refresh
+    right after a command is a memory read), otherwise from the snapshot cache."""
+    excel = live_handler(last_file)
+    if excel is not None:
+        return excel.read_window(max_rows=max_rows, max_cols=max_cols, sheet_name=excel.wb.sheetnames[0])
+    return snapshot_cache.window(last_file, max_rows=max_rows, max_cols=max_cols)
+
+
+def parse_cols(spec: Optional[str]):
+    """Parse the table `cols` parameter -> (first column, column count), 1-based.
+    Accepts "B:F" / "2:6" ranges or a plain count ("10" = first 10 columns)."""
+    if not spec:
+        return 1, DEFAULT_PAGE_COLS
+
+    def to_index(part: str) -> int:
+        part = part.strip()
+        return int(part) if part.isdigit() else column_index_from_string(part.upper())
+
+    if ":" in spec:
+        start_s, end_s = spec.split(":", 1)
+        start, end = to_index(start_s), to_index(end_s)
+    else:
+        start, end = 1, to_index(spec)
+    if start < 1 or end < start:
+        raise ValueError(f"bad column range: {spec}")
+    return start, min(end - start + 1, MAX_PAGE_COLS)
+
+
+def session_page(last_file: str, sheet: Optional[str], offset: int, limit: int, col_start: int, col_count: int):
+    """One page of data rows plus the header row for the same column window.
+    Uses the live ExcelHandler when it has this file open, otherwise streams the
+    page from disk (cached per file version) without parsing the rest of the sheet."""
+    excel = live_handler(last_file)
+    if excel is not None:
+        sheetnames = list(excel.wb.sheetnames)
+        sheet_name = sheet or sheetnames[0]
+        if sheet_name not in sheetnames:
+            raise KeyError(sheet_name)
+        total_rows, total_cols = excel.sheet_dimensions(sheet_name)
+        header = excel.read_page(1, 1, col_start, col_count, sheet_name)[0]
+        rows = excel.read_page(offset + 2, max(0, min(limit, total_rows - 1 - offset)),
+                               col_start, col_count, sheet_name)
+    else:
+        page = snapshot_cache.page(last_file, offset + 2, limit, col_start, col_count, sheet_name=sheet)
+        sheetnames, sheet_name = page.sheetnames, page.sheet_name
+        total_rows, total_cols = page.n_rows, page.n_cols
+        header, rows = page.header, page.rows
+
+    # Don't pad past the sheet's last used column
+    width = max(0, min(col_count, total_cols - col_start + 1))
+    return {
+        "sheet": sheet_name,
+        "sheets": sheetnames,
+        "headers": ["" if v is None else v for v in header[:width]],
+        "rows": [["" if v is None else v for v in row[:width]] for row in rows],
+        "offset": offset,
+        "limit": limit,
+        "colStart": col_start,
+        "totalRows": max(0, total_rows - 1),  # data rows, header excluded
+        "totalCols": total_cols,
+    }
+
+
 @app.get("/api/session/status")
 def status():
     # Return shape compatible with older frontend code
@@ -99,6 +381,16 @@ def start_session():
     return jsonify({"sessionId": session_id}), 200
 
 
+@app.post("/api/session/cleanup")
+def end_session():
+    """End a session now instead of waiting for it to expire."""
+    session_id = request.args.get("sessionId")
+    if not session_id or session_id not in sessions:
+        return jsonify({"error": "Session not found"}), 404
+    sessions.pop(session_id)
+    return jsonify({"success": True}), 200
+
+
 @app.post("/api/session/upload")
 def upload():
     session_id = request.args.get("sessionId")
@@ -115,31 +407,85 @@ def upload():
     suffix = os.path.splitext(f.filename)[1] or ".xlsx"
     ts = uuid.uuid4().hex[:8]
 
-    # If we already have a working file, back it up to history before switching
+    # Store the body once by content (hashed while it streams to disk) and link the
+    # working copy to it straight away, so a concurrent gc() can't drop the new blob
+    dest_path = dest_dir / f"{stem}_{ts}{suffix}"
+    digest = blob_store.put_stream(f.stream, suffix, dest_path=dest_path)
+
+    # Switch the session first, so commands from now on go to the new copy
+    hist_dir = dest_dir / "history"
     prev_path = sessions[session_id].get("last_file")
+    sessions[session_id].setdefault("files", []).append(str(dest_path))
+    sessions[session_id].setdefault("blobs", {})[str(dest_path)] = digest
+    sessions[session_id]["last_file"] = str(dest_path)
+
+    # If we already had a working file, back it up to history
     if prev_path and os.path.exists(prev_path):
-        hist_dir = dest_dir / "history"
-        hist_dir.mkdir(parents=True, exist_ok=True)
-        prev_name = os.path.basename(prev_path)
-        prev_stem, prev_suf = os.path.splitext(prev_name)
-        backup_path = hist_dir / f"{prev_stem}_saved_{ts}{prev_suf or '.xlsx'}"
+        owned = os.path.dirname(os.path.abspath(prev_path)) == os.path.abspath(dest_dir)
+        # History should hold the edits, not the last save. A server-owned copy is
+        # closed first (flushing whatever is still queued on it) so no edit can land
+        # in it after the snapshot; an open-local file stays open for other sessions.
+        if owned:
+            handlers.discard(prev_path)
+        else:
+            handlers.flush(prev_path)
         try:
-            import shutil
-            shutil.copyfile(prev_path, backup_path)
-        except Exception:
-            pass
+            snapshot_history(hist_dir, prev_path)
+            # A server-owned working copy now lives on in history; drop the old name
+            if owned:
+                blob_store.release(prev_path)
+                sessions[session_id]["files"] = [p for p in sessions[session_id].get("files", []) if p != prev_path]
+                # Saving replaced the upload's link, so release() can't see that blob
+                uploaded = sessions[session_id].get("blobs", {}).pop(prev_path, None)
+                if uploaded:
+                    blob_store.collect(uploaded, os.path.splitext(prev_path)[1] or ".xlsx")
+        except Exception as e:
+            print(f"⚠️ History snapshot failed: {e}")
 
-    # Save new upload with a unique name
-    dest_path = dest_dir / f"{stem}_{ts}{suffix}"
-    f.save(dest_path)
+    prune_history(hist_dir)
 
-    sessions[session_id].setdefault("files", []).append(str(dest_path))
-    sessions[session_id]["last_file"] = str(dest_path)
-    global LATEST_FILE
-    LATEST_FILE = dest_path
+    global latest_session_id
+    latest_session_id = session_id
+    publish_reload(session_id, "upload")
     return jsonify({"success": True, "path": str(dest_path)}), 200
 
 
+@app.post("/api/session/patch")
+def patch_session_file():
+    """Apply cell edits to the session's working copy instead of re-uploading the file.
+
+    Body: {"edits": [{"sheet", "cell", "old", "new"}, ...]}. Every "old" must match the
+    current value; if one doesn't, nothing is applied and 409 lists the conflicts, so
+    the client can fall back to a full upload. The file is saved in place (no new
+    version or history copy) and open previews get the cells over /api/session/events.
+    """
+    session_id = request.args.get("sessionId")
+    if not session_id or session_id not in sessions:
+        return jsonify({"error": "invalid sessionId"}), 400
+    last_file = sessions[session_id].get("last_file")
+    if not last_file or not os.path.exists(last_file):
+        return jsonify({"error": "no_file"}), 400
+
+    edits = (request.get_json(silent=True) or {}).get("edits")
+    if not isinstance(edits, list) or not all(isinstance(e, dict) and e.get("cell") for e in edits):
+        return jsonify({"error": "bad_edits"}), 400
+
+    def apply(excel: ExcelHandler):
+        conflicts = excel.apply_cell_edits(edits)
+        if not conflicts:
+            excel.flush()
+        return conflicts
+
+    try:
+        conflicts = handlers.submit(last_file, session_id, apply).result()
+    except ValueError as e:
+        return jsonify({"error": f"bad_edits: {e}"}), 400
+    if conflicts:
+        return jsonify({"error": "conflict", "conflicts": conflicts}), 409
+
+    return jsonify({"success": True, "applied": len(edits), "revision": table_revision(last_file)}), 200
+
+
 @app.get("/api/session/open-local")
 def open_local_file():
     """Let the user pick a local Excel file via OS dialog and use it in-place.
@@ -173,8 +519,9 @@ def open_local_file():
     # Point session to original file path
     sessions[session_id].setdefault("files", []).append(path)
     sessions[session_id]["last_file"] = path
-    global LATEST_FILE
-    LATEST_FILE = Path(path)
+    global latest_session_id
+    latest_session_id = session_id
+    publish_reload(session_id, "upload")
     return jsonify({"success": True, "path": path}), 200
 
 
@@ -192,24 +539,20 @@ def preview():
             200,
         )
 
-    # Render first sheet as styled HTML table with auto-refresh
-    wb = openpyxl.load_workbook(last_file, data_only=True)
-    sheet = wb[wb.sheetnames[0]]
+    # Render first sheet as styled HTML table; edits arrive over /api/session/events
+    # (streamed read of just the visible window, not a full workbook load)
     rows_html = []
-    max_rows = min(sheet.max_row or 0, 200)
-    max_cols = min(sheet.max_column or 0, 50)
-    for r in range(1, max_rows + 1):
-        cells = []
-        for c in range(1, max_cols + 1):
-            v = sheet.cell(row=r, column=c).value
-            cells.append(f"<td>{'' if v is None else v}</td>")
+    with handlers.reading(last_file):
+        window = session_window(last_file, DEFAULT_PAGE_ROWS, DEFAULT_PAGE_COLS)
+        sheet_name = first_sheet_name(last_file)
+    for r, row in enumerate(window, start=1):
+        cells = [f"<td id=\"c{r}_{c}\">{'' if v is None else v}</td>" for c, v in enumerate(row, start=1)]
         rows_html.append(f"<tr>{''.join(cells)}</tr>")
 
     html = f"""
     <html>
       <head>
         <title>Excel Live Preview</title>
-        <meta http-equiv=\"refresh\" content=\"15\" />
         <style>
           body{{font-family:Segoe UI, Roboto, Arial, sans-serif;background:#f5f7fb;margin:0;padding:24px;}}
           .wrap{{max-width:1100px;margin:0 auto;background:#fff;border-radius:8px;box-shadow:0 4px 16px rgba(0,0,0,0.06);overflow:hidden;}}
@@ -230,6 +573,7 @@ def preview():
           <div class=\"header\">📊 Excel Live Preview</div>
           <div class=\"meta\">
             Session: {session_id} &nbsp; | &nbsp; File: {os.path.basename(last_file)}
+            &nbsp; <span id=\"live\">⏳ Connecting…</span>
             <a class=\"btn right\" href=\"?sessionId={session_id}\">🔄 Refresh</a>
           </div>
           <div class=\"table-wrap\">
@@ -238,43 +582,133 @@ def preview():
             </table>
           </div>
         </div>
+        <script>
+          (function () {{
+            const sheet = {json.dumps(sheet_name)};
+            const maxRows = {DEFAULT_PAGE_ROWS}, maxCols = {DEFAULT_PAGE_COLS};
+            const live = document.getElementById('live');
+            const source = new EventSource('/api/session/events?sessionId={session_id}');
+            source.addEventListener('cells', function (e) {{
+              const data = JSON.parse(e.data);
+              for (const ch of data.changes) {{
+                if (ch.sheet !== sheet || ch.row > maxRows || ch.col > maxCols) continue;
+                const td = document.getElementById('c' + ch.row + '_' + ch.col);
+                // A new row/column isn't rendered yet: fetch the page again
+                if (!td) {{ location.reload(); return; }}
+                td.textContent = ch.value;
+              }}
+            }});
+            source.addEventListener('reload', function () {{ location.reload(); }});
+            source.onopen = function () {{ live.textContent = '🟢 Live'; }};
+            source.onerror = function () {{ live.textContent = '🔴 Reconnecting…'; }};
+          }})();
+        </script>
       </body>
     </html>
     """
     return html, 200
 
 
-@app.get("/api/session/table")
-def table_json():
-    """Return the current sheet as JSON headers+rows for on-page table refresh."""
+@app.get("/api/session/events")
+def session_events():
+    """Server-Sent Events stream of workbook changes for one session.
+
+    Events: hello (current revision), cells ({"revision", "changes": [...]} per edit)
+    and reload (upload or row shifts; fetch the table again). A reconnecting browser
+    sends Last-Event-ID and first gets the cells it missed, or a reload.
+    """
     session_id = request.args.get("sessionId")
     if not session_id or session_id not in sessions:
         return jsonify({"error": "invalid sessionId"}), 400
+
+    # Subscribe before reading the revision so nothing falls in between
+    q = change_broker.subscribe(session_id)
     last_file = sessions[session_id].get("last_file")
-    if not last_file or not os.path.exists(last_file):
-        return jsonify({"error": "no_file"}), 400
+    revision = table_revision(last_file) if last_file and os.path.exists(last_file) else None
+    first = [format_event("hello", {"revision": revision}, revision)]
+
+    last_seen = request.headers.get("Last-Event-ID")
+    if last_seen and revision and last_seen != revision:
+        with handlers.reading(last_file):
+            missed = handler_changes(last_file, last_seen)
+        if missed is None:
+            first.append(format_event("reload", {"revision": revision, "reason": "resync"}, revision))
+        elif missed:
+            first.append(format_event("cells", {"revision": revision, "changes": client_changes(missed)}, revision))
+
+    # An open preview counts as activity, so the session doesn't expire under it
+    stream = change_broker.stream(session_id, q, first, alive=lambda: sessions.touch(session_id))
+    resp = Response(stream, mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"  # don't let a reverse proxy buffer the stream
+    return resp
 
-    wb = openpyxl.load_workbook(last_file, data_only=True)
-    sheet = wb[wb.sheetnames[0]]
 
-    max_rows = min(sheet.max_row or 0, 200)
-    max_cols = min(sheet.max_column or 0, 50)
+@app.get("/api/session/table")
+def table_json():
+    """Return a page of the sheet as JSON headers+rows for on-page table refresh.
 
-    headers = []
-    if max_rows >= 1:
-        for c in range(1, max_cols + 1):
-            v = sheet.cell(row=1, column=c).value
-            headers.append("" if v is None else v)
+    Query params: offset (data rows to skip), limit (rows per page), cols ("B:F",
+    "2:6" or a count) and sheet (defaults to the first sheet). totalRows/totalCols
+    let the client size a virtual scroller.
 
-    rows = []
-    for r in range(2, max_rows + 1):
-        row_vals = []
-        for c in range(1, max_cols + 1):
-            v = sheet.cell(row=r, column=c).value
-            row_vals.append("" if v is None else v)
-        rows.append(row_vals)
+    Every response carries `revision`, also sent as the ETag: If-None-Match with an
+    unchanged revision gets 304. since=<revision> returns only the changed cells
+    ({"full": false, "changes": [...]}) when the server can; otherwise the full
+    page comes back with "full": true.
+    """
+    session_id = request.args.get("sessionId")
+    if not session_id or session_id not in sessions:
+        return jsonify({"error": "invalid sessionId"}), 400
+    last_file = sessions[session_id].get("last_file")
+    if not last_file or not os.path.exists(last_file):
+        return jsonify({"error": "no_file"}), 400
 
-    return jsonify({"headers": headers, "rows": rows}), 200
+    try:
+        offset = max(0, int(request.args.get("offset", 0)))
+        limit = min(max(0, int(request.args.get("limit", DEFAULT_PAGE_ROWS))), MAX_PAGE_ROWS)
+        col_start, col_count = parse_cols(request.args.get("cols"))
+    except ValueError as e:
+        return jsonify({"error": f"bad_params: {e}"}), 400
+
+    # Shared with other readers; waits only while a command is editing this workbook
+    with handlers.reading(last_file):
+        revision = table_revision(last_file)
+        if request.if_none_match.contains(revision):
+            not_modified = app.response_class(status=304)
+            not_modified.set_etag(revision)
+            return not_modified
+
+        sheet = request.args.get("sheet")
+        since = request.args.get("since")
+        changes = table_changes(last_file, since, sheet) if since else None
+        if changes is not None:
+            excel = live_handler(last_file)
+            try:
+                total_rows, total_cols = excel.sheet_dimensions(sheet or excel.wb.sheetnames[0])
+            except KeyError:
+                return jsonify({"error": "unknown_sheet"}), 400
+            body = {
+                "full": False,
+                "since": since,
+                "changes": client_changes(changes),
+                "totalRows": max(0, total_rows - 1),
+                "totalCols": total_cols,
+            }
+        else:
+            try:
+                body = session_page(last_file, sheet, offset, limit, col_start, col_count)
+            except KeyError:
+                return jsonify({"error": "unknown_sheet"}), 400
+            body["hasMore"] = offset + len(body["rows"]) < body["totalRows"]
+            body["full"] = True
+
+    body["revision"] = revision
+    resp = jsonify(body)
+    resp.set_etag(revision)
+    # Let browsers keep the body but always revalidate with If-None-Match
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp, 200
 
 
 @app.get("/api/session/download")
@@ -297,7 +731,10 @@ def download_current_file():
 # --- Voice endpoints on same server (port 8000) ---
 @app.get("/api/voice/health")
 def api_voice_health():
-    return jsonify({"ok": True, "service": "voice", "version": 1, "source": VOICE_SOURCE}), 200
+    # "ready" turns true once the speaker encoder has loaded in the background (see run())
+    encoder = encoder_status()
+    return jsonify({"ok": True, "service": "voice", "version": 1, "source": VOICE_SOURCE,
+                    "ready": encoder["state"] == "ready", "encoder": encoder}), 200
 
 
 def capture_and_transcribe_in_memory(device: Optional[int], duration: float = 5.0, sample_rate: int = 16000) -> Optional[str]:
@@ -319,24 +756,19 @@ def capture_and_transcribe_in_memory(device: Optional[int], duration: float = 5.
         return None
 
 
-@app.route("/api/voice/command", methods=["POST"])  # explicit to avoid confusion
-def api_voice_command():
-    result: Dict[str, Any] = {
-        "status": "error",
-        "steps": {
-            "microphone": False,
-            "speaker_identified": False,
-            "listened": False,
-            "parsed": False,
-            "executed": False,
-            "saved": False
-        }
-    }
-    try:
-        excel = ensure_excel_loaded()
+def voice_command_job(session_id: str, job_id: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """The spoken-command pipeline, run on the voice worker. Fills in result as each
+    stage finishes and pushes the progress to the session as a "job" event."""
+    def progress(stage: str, step: Optional[str] = None, ok: bool = False):
+        result["stage"] = stage
+        if step:
+            result["steps"][step] = ok
+        change_broker.publish(session_id, "job", {"jobId": job_id, "stage": stage, "steps": dict(result["steps"])})
 
+    try:
+        progress("microphone")
         dev = ensure_microphone_device()
-        result["steps"]["microphone"] = dev is not None
+        progress("speaker", "microphone", dev is not None)
 
         user_name, score = ensure_known_speaker(
             duration=3.0,
@@ -346,26 +778,81 @@ def api_voice_command():
             device=dev
         )
         result["speaker"] = {"name": user_name, "score": score, "recognized": user_name != "Unknown"}
-        result["steps"]["speaker_identified"] = user_name != "Unknown"
         if user_name == "Unknown":
             result["message"] = "Voice not recognized or enrollment declined."
-            return jsonify(result), 200
+            progress("done", "speaker_identified", False)
+            return result
+        progress("listening", "speaker_identified", True)
 
         speak("I'm listening. Please say your command.")
         # Simple SpeechRecognition-based capture using in-memory stream
         transcript = capture_and_transcribe_in_memory(device=dev)
         result["transcript"] = transcript
-        result["steps"]["listened"] = transcript is not None
         if not transcript:
             result["message"] = "No speech detected or transcription failed."
-            return jsonify(result), 200
+            progress("done", "listened", False)
+            return result
+        progress("executing", "listened", True)
+
+        # Only the parse/execute step waits for the workbook; listening above does not
+        submit_command(session_id, text_command(transcript, result)).result()
+        progress("done")
+        return result
+    except Exception as e:
+        result["error"] = str(e)
+        progress("failed")
+        raise
+
+
+@app.route("/api/voice/command", methods=["POST"])  # explicit to avoid confusion
+def api_voice_command():
+    """Listen for one spoken command, identify the speaker and execute it.
+
+    The pipeline runs on the voice worker. With ?wait=0 (or "wait": false) the reply
+    is 202 {"jobId"} at once; "stage" and the "steps" flags can then be followed at
+    /api/jobs/<jobId> or as "job" events on /api/session/events. Otherwise the
+    request waits and returns the finished result as before.
+    """
+    result: Dict[str, Any] = {
+        "status": "error",
+        "stage": "queued",
+        "steps": {
+            "microphone": False,
+            "speaker_identified": False,
+            "listened": False,
+            "parsed": False,
+            "executed": False,
+            "saved": False
+        }
+    }
+    try:
+        session_id = command_session_id()
+    except Exception as e:
+        result["error"] = str(e)
+        return jsonify(result), 500
+
+    job_id = new_job_id()
+    future = voice_jobs.submit(voice_command_job, session_id, job_id, result)
+    jobs.add(future, session_id, progress=result, job_id=job_id)
+    if not request_waits():
+        return jsonify({"status": "queued", "jobId": job_id}), 202
+    try:
+        future.result()
+        return jsonify(result), 200
+    except Exception:
+        return jsonify(result), 500
+
 
-        parsed = parse_command(transcript, excel)
+def text_command(text: str, result: Dict[str, Any]):
+    """Command for the workbook's writer queue: parse and execute text, save,
+    and record the outcome in result (which it also returns)."""
+    def run(excel: ExcelHandler) -> Dict[str, Any]:
+        parsed = parse_command(text, excel)
         result["parsed"] = parsed
         result["steps"]["parsed"] = parsed is not None
 
         try:
-            excel.wb.save(excel.filename)
+            excel.flush()
             result["steps"]["saved"] = True
         except Exception as e:
             result["save_error"] = str(e)
@@ -373,48 +860,108 @@ def api_voice_command():
         result["status"] = "ok"
         result["steps"]["executed"] = True
         result["message"] = "Command processed successfully"
-        return jsonify(result), 200
-
-    except Exception as e:
-        result["error"] = str(e)
-        return jsonify(result), 500
+        return result
+    return run
 
 
 @app.post("/api/voice/text")
 def api_text_command():
-    """Execute a text command directly (no microphone or speaker ID)."""
+    """Execute a text command directly (no microphone or speaker ID).
+
+    Commands on one workbook run one at a time on its writer queue. With ?wait=0
+    or "wait": false the reply is 202 {"jobId"} straight away; poll /api/jobs/<jobId>.
+    """
     result: Dict[str, Any] = {
         "status": "error",
         "steps": {"parsed": False, "executed": False, "saved": False}
     }
     try:
-        excel = ensure_excel_loaded()
+        session_id = command_session_id()
         payload = request.get_json(silent=True) or {}
         text = (payload.get("text") or "").strip()
         if not text:
             result["message"] = "Empty command"
             return jsonify(result), 400
 
-        parsed = parse_command(text, excel)
-        result["parsed"] = parsed
-        result["steps"]["parsed"] = parsed is not None
+        future = submit_command(session_id, text_command(text, result))
+        if not request_waits():
+            job_id = jobs.add(future, session_id)
+            return jsonify({"status": "queued", "jobId": job_id}), 202
+        future.result()
+        return jsonify(result), 200
+    except Exception as e:
+        result["error"] = str(e)
+        return jsonify(result), 500
+
 
+def batch_command(lines, atomic: bool):
+    """Command for the writer queue: run a batch of text commands and save once."""
+    def run(excel: ExcelHandler) -> Dict[str, Any]:
+        result = run_batch(excel, lines, atomic=atomic)
+        result["saved"] = False
         try:
-            excel.wb.save(excel.filename)
-            result["steps"]["saved"] = True
+            result["saved"] = excel.flush()  # False when nothing was applied
         except Exception as e:
             result["save_error"] = str(e)
+        if not result["failed"]:
+            result["status"] = "ok"
+        else:
+            result["status"] = "rejected" if atomic else "partial"
+        return result
+    return run
+
+
+@app.post("/api/voice/batch")
+def api_batch_command():
+    """Execute many text commands at once with a single save.
+
+    Body: {"lines": [...]} or {"text": "one command per line"}, optional "atomic".
+    Every line is checked before anything is written; the reply lists a result per
+    line. With "atomic": true one bad line rejects the whole batch (422), otherwise
+    the good lines are applied. Accepts "wait": false like /api/voice/text.
+    """
+    try:
+        session_id = command_session_id()
+    except RuntimeError as e:
+        return jsonify({"status": "error", "error": str(e)}), 500
+
+    payload = request.get_json(silent=True) or {}
+    lines = payload.get("lines")
+    if lines is None:
+        lines = (payload.get("text") or "").splitlines()
+    if not isinstance(lines, list) or not all(isinstance(line, str) for line in lines):
+        return jsonify({"status": "error", "error": "lines must be a list of strings"}), 400
+    lines = [line.strip() for line in lines if line.strip()]
+    if not lines:
+        return jsonify({"status": "error", "message": "Empty batch"}), 400
+    if len(lines) > MAX_BATCH_LINES:
+        return jsonify({"status": "error", "error": f"too many lines (max {MAX_BATCH_LINES})"}), 400
 
-        result["status"] = "ok"
-        result["steps"]["executed"] = True
-        result["message"] = "Command processed successfully"
-        return jsonify(result), 200
+    try:
+        future = submit_command(session_id, batch_command(lines, bool(payload.get("atomic"))))
+        if not request_waits():
+            job_id = jobs.add(future, session_id)
+            return jsonify({"status": "queued", "jobId": job_id}), 202
+        result = future.result()
     except Exception as e:
-        result["error"] = str(e)
-        return jsonify(result), 500
+        return jsonify({"status": "error", "error": str(e)}), 500
+    return jsonify(result), 422 if result["status"] == "rejected" else 200
+
+
+@app.get("/api/jobs/<job_id>")
+def job_status(job_id: str):
+    """State of a queued command: queued, running (with "progress" if the command
+    reports it), done (with "result") or error."""
+    info = jobs.status(job_id)
+    if info is None:
+        return jsonify({"error": "unknown_job"}), 404
+    return jsonify(info), 200
 
 
 def run(host: str = "127.0.0.1", port: int = 8000):
+    sweep_orphan_uploads()
+    sessions.start_reaper()
+    start_encoder_warmup()  # load the speaker model now, not on the first voice command
     app.run(host=host, port=port, debug=False)
 
 
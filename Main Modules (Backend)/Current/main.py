@@ -10,7 +10,6 @@ from openpyxl import Workbook
 import pyttsx3  # For Voice feedbacks (reverted from GTTS)
 import subprocess
 import webbrowser
-import requests
 import time
 import os
 import sys
@@ -26,9 +25,13 @@ from module_excel_handler import ExcelHandler, ask_for_excel_file, create_new_ex
 '''Importing modules for handling, parsing, NLP Transcripting User-Commands'''
 # Use simple voice input to avoid Whisper download issues
 from module_voice_input_simple import get_voice_input, prompt_for_device_choice, get_default_device_index
-from module_speaker_id import ensure_known_speaker
+from module_speaker_id import ensure_known_speaker, start_encoder_warmup
 from module_parse_command import parse_command  # Command Parsing module    
 from module_parse_command import set_speak_function
+from module_http_client import get_session
+
+# Shared keep-alive client for every call to the preview server and the controller
+http_client = get_session()
 
 # Whisper disabled to avoid download issues
 WHISPER_AVAILABLE = False
@@ -60,10 +63,64 @@ def speak(text: str):
 
 set_speak_function(speak)
 
-# Controller integration removed during reset
+# -------------------------
+# Controller channel (mic clicks and confirmations from the frontend)
+# -------------------------
+CONTROLLER_URL = "http://127.0.0.1:8001"
+CONTROLLER_WAIT_SECONDS = 25  # long-poll window; the controller answers as soon as an event arrives
+CONTROLLER_EVENTS = ("voice_command_requested", "command_confirmed", "stop")
+
+def update_backend_status(fields: dict):
+    """Send status fields (e.g. cleared flags) to the controller; best effort."""
+    try:
+        http_client.post(f"{CONTROLLER_URL}/api/backend/update-status", json=fields, timeout=2)
+    except Exception:
+        pass
+
+class ControllerChannel:
+    """Blocking feed of controller events via the /api/backend/events long-poll."""
+
+    def __init__(self, base_url: str = CONTROLLER_URL):
+        self.base_url = base_url
+        self.since = None   # last seen event seq (None: start from now)
+        self.pending = []   # received events nobody has waited for yet
+
+    def wait_for(self, kinds, timeout=None):
+        """Block until an event of one of these types arrives -> event dict (None on timeout)."""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            for i, event in enumerate(self.pending):
+                if event["type"] in kinds:
+                    return self.pending.pop(i)
+            wait = CONTROLLER_WAIT_SECONDS
+            if deadline is not None:
+                wait = min(wait, deadline - time.time())
+                if wait <= 0:
+                    return None
+            self.pending.extend(self._poll(wait))
+
+    def discard(self, kinds):
+        """Forget queued events of these types (e.g. a stale confirmation)."""
+        self.pending = [e for e in self.pending if e["type"] not in kinds]
+
+    def _poll(self, wait):
+        params = {"timeout": wait}
+        if self.since is not None:
+            params["since"] = self.since
+        try:
+            r = http_client.get(f"{self.base_url}/api/backend/events", params=params, timeout=wait + 5)
+            r.raise_for_status()
+            data = r.json()
+        except Exception:
+            time.sleep(1)  # controller down or restarting; try again shortly
+            return []
+        self.since = data.get("seq", self.since)
+        return [e for e in data.get("events", []) if e.get("type") in CONTROLLER_EVENTS]
 
 # Global variable to track server process
 server_process = None
+# Handler revision the preview copy was last synced to (None: needs a full upload)
+preview_revision = None
 
 # Ask yes/no prompt with full text displayed
 def ask_yes_no(prompt_text: str) -> bool:
@@ -105,9 +162,11 @@ signal.signal(signal.SIGTERM, signal_handler)
 
 '''Function that calls ask_for_excel_file and ExcelHandler functions from module_excel_handler'''
 def main():
-    global current_session_id
+    global current_session_id, preview_revision
     
     # Local flow start (no controller updates)
+    # Load the speaker model in the background while the microphone is being picked
+    start_encoder_warmup()
     
     #For speaker recognition, if unrecognized, enroll speaker after recording voice.
     # Prompt user for preferred microphone first; fallback to auto-select
@@ -158,6 +217,7 @@ def main():
     print()  # Empty line for spacing
     # Optionally start preview server and open live preview (keep available)
     session_id = ensure_preview_session(file_path)
+    preview_revision = excel.revision
 
     # Step 3: If multiple sheets exist, ask user which one
     excel.ws = excel.choose_sheet()
@@ -169,22 +229,13 @@ def main():
     speak("System ready. Click the microphone button to give a command.")
     
     # Step 4: Enter command loop - wait for microphone button clicks
+    controller = ControllerChannel()
     while True:
-        # Check if microphone button was clicked (via polling)
-        try:
-            response = requests.get(f"{CONTROLLER_URL}/api/backend/status", timeout=2)
-            if response.ok:
-                data = response.json()
-                if not data.get("running"):
-                    # Backend was stopped
-                    break
-                # Check if we should wait for microphone click
-                if not data.get("voice_command_requested", False):
-                    time.sleep(1)  # Wait before checking again
-                    continue
-        except:
-            time.sleep(1)
-            continue
+        # Block until the microphone button is clicked (no polling while idle)
+        event = controller.wait_for(("voice_command_requested", "stop"))
+        if event["type"] == "stop":
+            # Backend was stopped
+            break
         
         # Microphone button was clicked, start listening
         # Clear the request flag
@@ -211,8 +262,9 @@ def main():
             
             if command_text:
                 # Send recognized command to frontend via controller
+                controller.discard(("command_confirmed",))
                 try:
-                    requests.post(
+                    http_client.post(
                         f"{CONTROLLER_URL}/api/backend/set-recognized-command",
                         json={"command": command_text},
                         timeout=2
@@ -223,31 +275,14 @@ def main():
                 print(f"You said: {command_text}")
                 speak(f"I heard: {command_text}")
                 
-                # Wait for confirmation from frontend (polling)
+                # Wait for confirmation from frontend (arrives as an event, up to 30 seconds)
                 confirmed = False
-                max_wait = 30  # Wait up to 30 seconds for confirmation
-                start_wait = time.time()
-                while (time.time() - start_wait) < max_wait:
-                    try:
-                        response = requests.get(f"{CONTROLLER_URL}/api/backend/status", timeout=2)
-                        if response.ok:
-                            data = response.json()
-                            # Check if command was confirmed/rejected (recognized_command becomes None and command_confirmed is set)
-                            if data.get("recognized_command") is None and data.get("command_confirmed") is not None:
-                                confirmed = data.get("command_confirmed", False)
-                                # Reset the confirmation flag
-                                try:
-                                    requests.post(
-                                        f"{CONTROLLER_URL}/api/backend/update-status",
-                                        json={"command_confirmed": None},
-                                        timeout=2
-                                    )
-                                except:
-                                    pass
-                                break
-                    except:
-                        pass
-                    time.sleep(0.5)
+                max_wait = 30
+                event = controller.wait_for(("command_confirmed", "stop"), timeout=max_wait)
+                if event is not None and event["type"] == "command_confirmed":
+                    confirmed = bool(event["data"].get("confirmed"))
+                    # Reset the confirmation flag
+                    update_backend_status({"command_confirmed": None})
                 
                 if confirmed:
                     print()  # Empty line for spacing
@@ -281,14 +316,14 @@ def main():
     
         # Save changes after each command, with safety
         try:
-            excel.wb.save(excel.filename)
+            excel.flush()
             print("✅ Excel file saved successfully")
             print()  # Empty line for spacing
         except PermissionError:
             speak("⚠️ Excel file is locked by another program. Please close Excel and press Enter.")
             input("Press Enter after closing Excel...")
             try:
-                excel.wb.save(excel.filename)
+                excel.flush()
                 print("✅ Excel file saved successfully after retry")
             except Exception as e:
                 print(f"❌ Failed to save after retry: {e}")
@@ -300,7 +335,7 @@ def main():
         # Push updated file to live preview session
         if session_id:
             try:
-                upload_to_preview_session(session_id, excel.filename)
+                sync_preview_session(session_id, excel)
             except Exception as e:
                 print(f"⚠️ Preview refresh failed: {e}")
 
@@ -354,14 +389,14 @@ def main():
                     
                     # Save changes after command
                     try:
-                        excel.wb.save(excel.filename)
+                        excel.flush()
                         print("✅ Excel file saved successfully")
                         print()  # Empty line for spacing
                     except PermissionError:
                         speak("⚠️ Excel file is locked by another program. Please close Excel and press Enter.")
                         input("Press Enter after closing Excel...")
                         try:
-                            excel.wb.save(excel.filename)
+                            excel.flush()
                             print("✅ Excel file saved successfully after retry")
                         except Exception as e:
                             print(f"❌ Failed to save after retry: {e}")
@@ -373,7 +408,7 @@ def main():
                     # Push updated file to live preview session
                     if session_id:
                         try:
-                            upload_to_preview_session(session_id, excel.filename)
+                            sync_preview_session(session_id, excel)
                         except Exception as e:
                             print(f"⚠️ Preview refresh failed: {e}")
                     
@@ -410,9 +445,12 @@ def main():
 def ensure_preview_server(port: int = 8000):
     global server_process
     
+    # Startup probes fail fast (no retries); the loop below does its own waiting
+    probe = get_session(retry=False)
+
     # First check if server is already running
     try:
-        response = requests.get(f"http://127.0.0.1:{port}/api/session/status", timeout=2)
+        response = probe.get(f"http://127.0.0.1:{port}/api/session/status", timeout=2)
         if response.status_code == 200:
             print("Live preview server already running")
             return True
@@ -444,7 +482,7 @@ def ensure_preview_server(port: int = 8000):
         for i in range(30):  # 9 seconds total
             try:
                 time.sleep(0.3)
-                response = requests.get(f"http://127.0.0.1:{port}/api/session/status", timeout=2)
+                response = probe.get(f"http://127.0.0.1:{port}/api/session/status", timeout=2)
                 if response.status_code == 200:
                     print("Live preview server started successfully")
                     return True
@@ -473,7 +511,7 @@ def ensure_preview_session(file_path: str) -> str:
         print("Live preview server unavailable. Continuing without preview.")
         return ""
     try:
-        r = requests.post("http://127.0.0.1:8000/api/session/start", timeout=5)
+        r = http_client.post("http://127.0.0.1:8000/api/session/start", timeout=5)
         r.raise_for_status()
         session_id = r.json().get("sessionId", "")
         if session_id:
@@ -485,10 +523,35 @@ def ensure_preview_session(file_path: str) -> str:
         return ""
 
 
+def sync_preview_session(session_id: str, excel):
+    """Send the edits made since the last sync as a cell patch (a few bytes).
+    Falls back to a full upload when the edits can't be replayed (rows deleted,
+    change log overrun) or the server rejects the patch."""
+    global preview_revision
+    changes = excel.changes_since(preview_revision) if preview_revision is not None else None
+    if changes == []:
+        return  # nothing changed since the last sync
+    if changes is not None:
+        edits = [{"sheet": c["sheet"], "cell": c["cell"], "old": c["old"], "new": c["value"]} for c in changes]
+        r = http_client.post(
+            "http://127.0.0.1:8000/api/session/patch",
+            params={"sessionId": session_id},
+            data=json.dumps({"edits": edits}, default=str),
+            headers={"Content-Type": "application/json"},
+            timeout=10,
+        )
+        if r.status_code != 200:
+            print(f"⚠️ Preview patch rejected ({r.status_code}); uploading the whole file instead")
+            changes = None
+    if changes is None:
+        upload_to_preview_session(session_id, excel.filename)
+    preview_revision = excel.revision
+
+
 def upload_to_preview_session(session_id: str, file_path: str):
     with open(file_path, "rb") as f:
         files = {"file": (os.path.basename(file_path), f.read(), "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")}
-    r = requests.post(f"http://127.0.0.1:8000/api/session/upload", params={"sessionId": session_id}, files=files, timeout=10)
+    r = http_client.post(f"http://127.0.0.1:8000/api/session/upload", params={"sessionId": session_id}, files=files, timeout=10)
     r.raise_for_status()
 
 if __name__ == "__main__":
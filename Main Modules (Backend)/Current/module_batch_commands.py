@@ -0,0 +1,140 @@
+# module_batch_commands.py
+# Run many text commands ("add 85 for Priya in DSA", one per line) against one
+# workbook as a single edit. Every line is parsed and resolved against the
+# handler's cached student/subject indexes first, the resulting cell edits are
+# applied together with ExcelHandler.apply_cell_edits, and the caller saves once.
+
+from typing import Any, Dict, List, Optional
+
+from openpyxl.utils.cell import coordinate_to_tuple
+
+from module_parse_command import parse_with_regex
+
+MAX_BATCH_LINES = 500
+
+# action -> (creates missing students, how the new value is derived)
+WRITE_ACTIONS = {
+    "add": (True, "value"),
+    "insert": (True, "value"),
+    "create": (True, "value"),
+    "set": (True, "value"),
+    "update": (False, "value"),
+    "change": (False, "value"),
+    "delete": (False, "clear"),
+    "remove": (False, "clear"),
+    "subtract": (False, "subtract"),
+}
+
+
+def run_batch(excel, lines: List[str], atomic: bool = False) -> Dict[str, Any]:
+    """Plan and apply a batch of commands on excel's active sheet (not saved here).
+
+    Returns {"results": [...one per line...], "applied", "failed", "atomic"}. A line that
+    can't be parsed or resolved gets "ok": False and an "error". With atomic=True one
+    such line means nothing is applied; otherwise the other lines still are.
+    """
+    planner = _BatchPlan(excel)
+    results = [planner.plan(number, text) for number, text in enumerate(lines, start=1)]
+    failed = sum(1 for r in results if not r["ok"])
+
+    applied = 0
+    if planner.edits and not (atomic and failed):
+        conflicts = excel.apply_cell_edits(list(planner.edits.values()))
+        if conflicts:  # the sheet changed under us; can't happen on the writer thread
+            raise RuntimeError(f"batch conflicts with concurrent edits: {conflicts}")
+        applied = len(results) - failed
+    for r in results:
+        r["applied"] = r["ok"] and bool(applied)
+    return {"results": results, "applied": applied, "failed": failed, "atomic": atomic}
+
+
+class _BatchPlan:
+    """Turns command lines into pending cell edits, seeing the edits of earlier lines."""
+
+    def __init__(self, excel):
+        self.excel = excel
+        self.sheet = excel.ws.title
+        self.edits: Dict[str, Dict[str, Any]] = {}   # cell -> {"sheet", "cell", "old", "new"}
+        self.new_rows: Dict[str, int] = {}           # lowercased name -> row added by this batch
+        self.next_row: Optional[int] = None
+
+    def plan(self, number: int, text: str) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"line": number, "text": text, "ok": False}
+        intent = parse_with_regex(text) if text.strip() else None
+        if not intent:
+            result["error"] = "could not parse"
+            return result
+        action, name, subject, value = (intent.get(k) for k in ("action", "name", "subject", "value"))
+        result.update({"action": action, "name": name, "subject": subject})
+
+        if action not in WRITE_ACTIONS:
+            result["error"] = f"unsupported action: {action}" if action else "no action"
+            return result
+        creates, mode = WRITE_ACTIONS[action]
+        if not name:
+            result["error"] = "no student name"
+            return result
+        if not subject:
+            result["error"] = "no subject"
+            return result
+        if mode != "clear" and value is None:
+            result["error"] = "no value"
+            return result
+
+        column, message = self.excel.resolve_subject(subject)
+        if not column:
+            result["error"] = message
+            return result
+        row = self._student_row(name)
+        if row is None and not creates:
+            result["error"] = f"student '{name}' not found"
+            return result
+
+        cell = f"{column}{row or self._peek_new_row()}"
+        old = self._current(cell) if row else None
+        if mode == "clear":
+            new = ""
+        elif mode == "subtract":
+            try:
+                new = (float(old) if old not in (None, "") else 0) - value
+            except (TypeError, ValueError):
+                new = 0 - value
+        else:
+            new = value
+
+        if row is None:
+            row = self._add_student(name)
+        self._edit(cell, new)
+        result.update({"ok": True, "cell": cell, "old": old, "value": new})
+        return result
+
+    def _student_row(self, name: str) -> Optional[int]:
+        return self.new_rows.get(name.strip().lower()) or self.excel.find_student_row(name)
+
+    def _peek_new_row(self) -> int:
+        if self.next_row is None:
+            self.next_row = self.excel.ws.max_row + 1
+        return self.next_row
+
+    def _add_student(self, name: str) -> int:
+        row = self._peek_new_row()
+        self.next_row = row + 1
+        self.new_rows[name.strip().lower()] = row
+        self._edit(f"A{row}", name)
+        return row
+
+    def _current(self, cell: str):
+        if cell in self.edits:
+            return self.edits[cell]["new"]
+        return self._stored(cell)
+
+    def _stored(self, cell: str):
+        # Read without ws[cell], which would create the cell (and grow max_row)
+        current = self.excel.ws._cells.get(coordinate_to_tuple(cell))
+        return current.value if current is not None else None
+
+    def _edit(self, cell: str, new) -> None:
+        if cell in self.edits:
+            self.edits[cell]["new"] = new
+        else:
+            self.edits[cell] = {"sheet": self.sheet, "cell": cell, "old": self._stored(cell), "new": new}
@@ -0,0 +1,182 @@
+# module_blob_store.py
+# Content-addressed storage for uploaded workbooks and their history snapshots.
+# Each distinct file body is stored once as blobs/<sha256[:2]>/<sha256><ext>; session
+# files are hardlinks to it, so the link count doubles as the reference count and a
+# blob is dropped once nothing links to it any more. Where hardlinks aren't supported
+# the file is copied instead and its path recorded in a <blob>.links manifest.
+# Writers must replace linked files (save to a temp file + os.replace, as
+# ExcelHandler does) rather than write into them, or every link would change.
+# A new blob has no links until one is made, so gc() and "store, then link" share
+# BlobStore.lock: pass dest_path to put_stream, or hold the lock across put_file + link.
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from typing import BinaryIO, List, Optional
+
+CHUNK_SIZE = 1024 * 1024
+LINKS_SUFFIX = ".links"  # manifest of copied (not hardlinked) references, next to the blob
+
+
+class BlobStore:
+    """Deduplicating file store rooted at one directory."""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(str(root))
+        os.makedirs(self.root, exist_ok=True)
+        self.lock = threading.RLock()  # keeps gc() out between storing a blob and linking it
+
+    def blob_path(self, digest: str, suffix: str = ".xlsx") -> str:
+        return os.path.join(self.root, digest[:2], digest + suffix)
+
+    # ---------------------------
+    # Adding content
+    # ---------------------------
+    def put_stream(self, stream: BinaryIO, suffix: str = ".xlsx", dest_path=None) -> str:
+        """Store a stream's bytes (hashed while written) -> sha256 hex digest.
+        With dest_path the blob is also linked there before gc() can see it."""
+        fd, tmp_path = tempfile.mkstemp(prefix=".~blob-", dir=self.root)
+        sha = hashlib.sha256()
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                    sha.update(chunk)
+                    out.write(chunk)
+            with self.lock:
+                digest = self._commit(tmp_path, sha.hexdigest(), suffix)
+                if dest_path is not None:
+                    self.link(digest, dest_path, suffix)
+            return digest
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def put_file(self, path: str) -> str:
+        """Store a copy of an existing file -> digest. Nothing is copied if the content is known."""
+        suffix = os.path.splitext(path)[1] or ".xlsx"
+        digest = file_digest(path)
+        if not os.path.exists(self.blob_path(digest, suffix)):
+            with open(path, "rb") as f:
+                self.put_stream(f, suffix)
+        return digest
+
+    def _commit(self, tmp_path: str, digest: str, suffix: str) -> str:
+        target = self.blob_path(digest, suffix)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(tmp_path, target)
+        return digest
+
+    # ---------------------------
+    # Referencing content
+    # ---------------------------
+    def link(self, digest: str, dest_path, suffix: str = ".xlsx") -> str:
+        """Expose a blob at dest_path (hardlink; plain copy where links aren't supported).
+        A copy doesn't raise the link count, so it is listed in the blob's .links manifest."""
+        dest_path = os.path.abspath(str(dest_path))
+        source = self.blob_path(digest, suffix)
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        with self.lock:
+            if os.path.exists(dest_path):
+                os.remove(dest_path)
+            try:
+                os.link(source, dest_path)
+            except OSError:
+                shutil.copyfile(source, dest_path)
+                with open(source + LINKS_SUFFIX, "a", encoding="utf-8") as f:
+                    f.write(dest_path + "\n")
+        return dest_path
+
+    def refcount(self, digest: str, suffix: str = ".xlsx") -> int:
+        """Number of session/history files currently sharing this blob."""
+        blob = self.blob_path(digest, suffix)
+        try:
+            links = os.stat(blob).st_nlink - 1
+        except FileNotFoundError:
+            return 0
+        return links + len(self._copies(blob))
+
+    def release(self, path) -> bool:
+        """Delete one session/history file, and its blob if nothing else refers to it.
+        -> True if the blob went too. Only that blob is checked, unlike gc()."""
+        path = os.path.abspath(str(path))
+        suffix = os.path.splitext(path)[1] or ".xlsx"
+        try:
+            blob = self.blob_path(file_digest(path), suffix)
+        except FileNotFoundError:
+            return False
+        with self.lock:
+            os.remove(path)
+            if not os.path.exists(blob):
+                return False  # saved over since it was linked; it no longer shares a blob
+            return self._collect(blob)
+
+    def collect(self, digest: str, suffix: str = ".xlsx") -> bool:
+        """Delete one blob if nothing refers to it any more (e.g. its last link was saved over)."""
+        with self.lock:
+            return self._collect(self.blob_path(digest, suffix))
+
+    def gc(self) -> int:
+        """Delete every blob nothing refers to any more -> number removed.
+        Walks the whole store; for files dropped one at a time use release()/collect()."""
+        removed = 0
+        with self.lock:
+            for dirpath, _, filenames in os.walk(self.root):
+                for name in filenames:
+                    if name.startswith(".~blob-") or name.endswith(LINKS_SUFFIX):
+                        continue  # in-flight put_stream / copy manifest
+                    removed += self._collect(os.path.join(dirpath, name))
+        return removed
+
+    def _collect(self, blob: str) -> bool:
+        # Caller holds self.lock
+        try:
+            if os.stat(blob).st_nlink > 1 or self._copies(blob):
+                return False
+            os.remove(blob)
+        except FileNotFoundError:
+            return False
+        if os.path.exists(blob + LINKS_SUFFIX):
+            os.remove(blob + LINKS_SUFFIX)
+        return True
+
+    def _copies(self, blob: str) -> List[str]:
+        """Copied links of a blob that still exist (the manifest is trimmed to them)."""
+        manifest = blob + LINKS_SUFFIX
+        try:
+            with open(manifest, "r", encoding="utf-8") as f:
+                listed = [line.strip() for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+        alive = [p for p in dict.fromkeys(listed) if os.path.exists(p)]
+        if len(alive) != len(listed):
+            with open(manifest, "w", encoding="utf-8") as f:
+                f.writelines(p + "\n" for p in alive)
+        return alive
+
+    def stats(self) -> dict:
+        blobs = total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.startswith(".~blob-") and not name.endswith(LINKS_SUFFIX):
+                    blobs += 1
+                    total += os.path.getsize(os.path.join(dirpath, name))
+        return {"blobs": blobs, "bytes": total}
+
+
+def file_digest(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def same_file(a: str, b: Optional[str]) -> bool:
+    """True if both paths name the same inode (e.g. two links to one blob)."""
+    try:
+        return bool(b) and os.path.samefile(a, b)
+    except OSError:
+        return False
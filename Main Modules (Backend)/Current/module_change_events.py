@@ -0,0 +1,89 @@
+# module_change_events.py
+# In-process publish/subscribe for workbook change notifications.
+# backend/server.py publishes cell edits and uploads per session; each open
+# Server-Sent Events stream owns one queue and blocks on it, so an idle
+# preview costs a sleeping thread instead of a poll every few seconds.
+
+import json
+import queue
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+EVENT_QUEUE_SIZE = 500   # pending events per subscriber before it is told to reload
+HEARTBEAT_SECONDS = 15   # comment line sent on idle streams to keep proxies from closing them
+
+
+def format_event(event: str, data: Any, event_id: Optional[str] = None) -> str:
+    """One message in text/event-stream format."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class ChangeBroker:
+    """Fan out formatted SSE messages to every subscriber of a key (a session id)."""
+
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, List[queue.Queue]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, key: str) -> queue.Queue:
+        q: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(key, []).append(q)
+        return q
+
+    def unsubscribe(self, key: str, q: queue.Queue) -> None:
+        with self._lock:
+            subs = self._subscribers.get(key, [])
+            if q in subs:
+                subs.remove(q)
+            if not subs:
+                self._subscribers.pop(key, None)
+
+    def subscriber_count(self, key: str) -> int:
+        with self._lock:
+            return len(self._subscribers.get(key, []))
+
+    def publish(self, key: str, event: str, data: Any, event_id: Optional[str] = None) -> int:
+        """Queue an event for all subscribers of key; returns how many got it.
+        Never blocks: a subscriber that fell too far behind gets its backlog replaced by a reload."""
+        with self._lock:
+            subs = list(self._subscribers.get(key, []))
+        if not subs:
+            return 0
+        message = format_event(event, data, event_id)
+        for q in subs:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                _drain(q)
+                q.put_nowait(format_event("reload", {"reason": "backlog"}, event_id))
+        return len(subs)
+
+    def stream(self, key: str, q: queue.Queue, first: Optional[List[str]] = None,
+               heartbeat: float = HEARTBEAT_SECONDS, alive=lambda: True) -> Iterator[str]:
+        """Generator for a streaming response: yields queued messages as they arrive.
+        Ends (and unsubscribes) when the client disconnects or alive() turns false."""
+        try:
+            for message in first or []:
+                yield message
+            while alive():
+                try:
+                    yield q.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+        finally:
+            self.unsubscribe(key, q)
+
+
+def _drain(q: queue.Queue) -> None:
+    while True:
+        try:
+            q.get_nowait()
+        except queue.Empty:
+            return
@@ -0,0 +1,138 @@
+# module_command_queue.py
+# Concurrency control for open workbooks in backend/server.py.
+# Every workbook gets one writer thread that runs its commands in arrival order
+# (so two commands can never interleave inside openpyxl or wb.save), while the
+# table/preview endpoints read it concurrently under a shared lock.
+# Submitting a command returns a Future; JobTable maps job ids to those futures
+# for clients that don't want to wait on the request.
+
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+MAX_JOBS = 500   # finished jobs remembered for status lookups
+
+
+class ReadWriteLock:
+    """Many readers or one writer. Waiting writers block new readers, so a steady
+    stream of table refreshes can't starve a command. Not reentrant."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class CommandQueue:
+    """Single-writer FIFO for one workbook plus the lock its readers share."""
+
+    def __init__(self, name: str = "workbook"):
+        self.lock = ReadWriteLock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"writer-{name}")
+
+    def submit(self, fn: Callable[..., Any], *args, exclusive: bool = True) -> Future:
+        """Queue fn(*args) -> Future. Exclusive jobs hold the write lock; the others
+        (e.g. a flush, which only reads the workbook) let readers in alongside.
+        Raises RuntimeError once the queue is shut down."""
+        return self._executor.submit(self._run, fn, args, exclusive)
+
+    def _run(self, fn, args, exclusive: bool):
+        with (self.lock.write() if exclusive else self.lock.read()):
+            return fn(*args)
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Stop accepting jobs; those already queued still run."""
+        self._executor.shutdown(wait=wait)
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+class JobTable:
+    """Job id -> Future for submitted commands, keeping the most recent MAX_JOBS.
+
+    A job may also carry a progress dict that its worker fills in as it goes;
+    status() reports a copy of it until the job has a result.
+    """
+
+    def __init__(self, max_jobs: int = MAX_JOBS):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, future: Future, session_id: Optional[str] = None,
+            progress: Optional[Dict[str, Any]] = None, job_id: Optional[str] = None) -> str:
+        job_id = job_id or new_job_id()
+        with self._lock:
+            self._jobs[job_id] = {"future": future, "sessionId": session_id, "created": time.time(),
+                                  "progress": progress}
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        return job_id
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """{"jobId", "state": queued|running|done|error, "result"|"error"|"progress"} or None if unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        future: Future = job["future"]
+        info = {"jobId": job_id, "sessionId": job["sessionId"], "created": job["created"]}
+        if not future.done():
+            info["state"] = "running" if future.running() else "queued"
+            if job["progress"] is not None:
+                info["progress"] = _snapshot(job["progress"])
+        elif future.exception() is not None:
+            info["state"] = "error"
+            info["error"] = str(future.exception())
+            if job["progress"] is not None:
+                info["progress"] = _snapshot(job["progress"])
+        else:
+            info["state"] = "done"
+            info["result"] = future.result()
+        return info
+
+
+def _snapshot(progress: Dict[str, Any]) -> Dict[str, Any]:
+    # The worker may add a key while we copy; just copy again
+    while True:
+        try:
+            return copy.deepcopy(progress)
+        except RuntimeError:
+            continue
@@ -3,13 +3,25 @@
 
 import openpyxl
 import os
+import shutil
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict, deque
 from openpyxl import Workbook
 from tkinter import Tk, filedialog, messagebox, simpledialog
 from fuzzywuzzy import fuzz
 from pathlib import Path
 import json
 import zipfile
-from openpyxl.utils.exceptions import InvalidFileException
+from openpyxl.utils.exceptions import InvalidFileException, CellCoordinatesException
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE, KNOWN_TYPES
+from openpyxl.utils.cell import coordinate_to_tuple
+from module_name_matcher import NameMatcher
+
+CHANGE_LOG_SIZE = 1000  # cell edits kept for delta (since=<revision>) reads
+SUBJECT_CACHE_SIZE = 256  # resolved spoken subjects kept per handler
+MAX_ROW, MAX_COLUMN = 1048576, 16384  # Excel's sheet limits
 
 from tkinter import Tk, filedialog
 #Ask user for which file to pick
@@ -70,10 +82,30 @@ def create_new_excel_file(app_folder=None):
     return None
 
 class ExcelHandler:
-    def __init__(self, filename):
+    def __init__(self, filename, autosave_delay=None, autosave_submit=None):
         self.filename = filename
         self.app_folder = self._ensure_app_folder()
 
+        # Write-behind saving: edits mark the workbook dirty, flush() writes it once.
+        # With autosave_delay (seconds) a debounce timer also flushes after the last edit.
+        # Edits don't take _save_lock, so a workbook edited from more than one thread must
+        # pass autosave_submit(fn), which runs the timer's flush on the thread that owns
+        # the edits (e.g. a CommandQueue's submit); without it the timer thread saves.
+        self.autosave_delay = autosave_delay
+        self.autosave_submit = autosave_submit
+        self._dirty = False
+        self._save_lock = threading.RLock()
+        self._autosave_timer = None
+        self._dimension_cache = {}
+
+        # Revision counter + change log, so readers can ask for "what changed since N".
+        # epoch tells revisions of different handler instances apart.
+        self.epoch = uuid.uuid4().hex[:8]
+        self.revision = 0
+        self._change_log = deque(maxlen=CHANGE_LOG_SIZE)
+        self._log_floor = 0  # oldest revision the log can still answer from
+        self._change_listeners = []
+
         if os.path.exists(filename):
             # ✅ Open existing Excel file if it's a valid workbook; otherwise create a fresh one
             try:
@@ -82,6 +114,7 @@ class ExcelHandler:
             except (zipfile.BadZipFile, InvalidFileException):
                 # File exists but is empty/corrupt or not a valid xlsx yet (e.g., NamedTemporaryFile)
                 self.wb = openpyxl.Workbook()
+                os.remove(filename)  # unlink first: the path may be a hardlink shared with other files
                 self.wb.save(filename)
                 print(f"Reinitialized invalid Excel file: {filename}")
         else:
@@ -99,8 +132,11 @@ class ExcelHandler:
             self.ws = self.wb[self.wb.sheetnames[0]]
         
         # Detect headers and setup data structures
-        self.headers = self._detect_headers()
+        self._header_index_sig = None
+        self._ensure_header_index()
         self.student_data = self._load_student_data()
+        self.name_matcher = NameMatcher(self.student_data.keys())
+        self._student_index_sig = self._index_signature()
 
     #Ask the user which sheet to choose when multiple sheets exist
     def choose_sheet(self):
@@ -148,15 +184,140 @@ class ExcelHandler:
 
     def save(self):
         """Save changes to workbook."""
-        self.wb.save(self.filename)
+        with self._save_lock:
+            self._write_workbook()
+            self._dirty = False
+            self._cancel_autosave()
+
+    def mark_dirty(self):
+        """Record an unsaved edit; it is written by flush() or the autosave timer."""
+        with self._save_lock:
+            self._dirty = True
+            if self.autosave_delay is not None:
+                # Debounce: restart the countdown on every edit
+                self._cancel_autosave()
+                self._autosave_timer = threading.Timer(self.autosave_delay, self._autosave)
+                self._autosave_timer.daemon = True
+                self._autosave_timer.start()
+
+    @property
+    def dirty(self):
+        return self._dirty
+
+    def flush(self):
+        """Write pending edits to disk once. Returns True if a write happened."""
+        with self._save_lock:
+            if not self._dirty:
+                return False
+            self.save()
+            return True
+
+    def close(self):
+        """Flush pending edits and stop the autosave timer."""
+        self.flush()
+        self._cancel_autosave()
+
+    def _autosave(self):
+        if self.autosave_submit is not None:
+            self.autosave_submit(self.flush)
+        else:
+            self.flush()
+
+    def _cancel_autosave(self):
+        if self._autosave_timer is not None:
+            self._autosave_timer.cancel()
+            self._autosave_timer = None
+
+    def _record_change(self, cell, old_value):
+        """Bump the revision and log one cell edit (sheet, row, column, old and new value)"""
+        if old_value == cell.value:
+            return
+        if len(self._change_log) == self._change_log.maxlen:
+            # The oldest entry is about to fall off; deltas from before it are no longer possible
+            self._log_floor = self._change_log[0][0]
+        self.revision += 1
+        self._track_dimensions(cell)
+        self._change_log.append((self.revision, cell.parent.title, cell.row, cell.column, old_value, cell.value))
+        self._notify(self._change_entry(cell.parent.title, cell.row, cell.column, old_value, cell.value))
+
+    def _record_reset(self):
+        """Bump the revision for an edit that can't be expressed per cell (e.g. rows shifting)"""
+        self.revision += 1
+        self._dimension_cache.clear()
+        self._change_log.clear()
+        self._log_floor = self.revision
+        self._notify(None)
+
+    def add_change_listener(self, listener):
+        """Call listener(handler, change) after every logged edit.
+        change is a changes_since()-style dict, or None when readers must reload."""
+        self._change_listeners.append(listener)
+
+    def remove_change_listener(self, listener):
+        if listener in self._change_listeners:
+            self._change_listeners.remove(listener)
+
+    def _notify(self, change):
+        for listener in list(self._change_listeners):
+            try:
+                listener(self, change)
+            except Exception as e:
+                print(f"⚠️ Change listener failed: {e}")
+
+    @staticmethod
+    def _change_entry(sheet, row, col, old, value):
+        return {'sheet': sheet, 'row': row, 'col': col,
+                'cell': f"{openpyxl.utils.get_column_letter(col)}{row}", 'old': old, 'value': value}
+
+    def changes_since(self, revision):
+        """Cells changed after `revision`, one entry per cell with its value at `revision`
+        and its latest value: [{'sheet', 'row', 'col', 'cell', 'old', 'value'}, ...].
+        Returns None when the log can't answer (too old, or from another epoch) and
+        the caller has to reload everything."""
+        if revision < self._log_floor or revision > self.revision:
+            return None
+        latest = {}
+        for rev, sheet, row, col, old, new in list(self._change_log):
+            if rev > revision:
+                first = latest.pop((sheet, row, col), (old, None))[0]  # keep the final order of edits
+                latest[(sheet, row, col)] = (first, new)
+        return [self._change_entry(sheet, row, col, old, new) for (sheet, row, col), (old, new) in latest.items()]
+
+    def _write_workbook(self):
+        """Atomically replace the file: save to a temp file in the same folder, then rename."""
+        # Keep an in-sync index valid across our own save (mtime changes, data doesn't)
+        students_in_sync = self._student_index_sig == self._index_signature()
+
+        folder = os.path.dirname(os.path.abspath(self.filename))
+        suffix = os.path.splitext(self.filename)[1] or ".xlsx"
+        fd, tmp_path = tempfile.mkstemp(prefix=".~save-", suffix=suffix, dir=folder)
+        os.close(fd)
+        try:
+            self.wb.save(tmp_path)
+            if os.path.exists(self.filename):
+                shutil.copymode(self.filename, tmp_path)  # mkstemp files are 0600
+            os.replace(tmp_path, self.filename)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        if students_in_sync:
+            self._student_index_sig = self._index_signature()
 
     # ---------------------------
     # CRUD Functions
     # ---------------------------
     def add_score(self, student_name, subject, score):
         """Add a new score for a student and subject."""
+        self._ensure_student_index()
         self.ws.append([student_name, subject, score])
-        self.save()
+        new_row = self.ws.max_row
+        for col in range(1, 4):
+            self._record_change(self.ws.cell(row=new_row, column=col), None)
+        self._index_student(student_name, new_row)
+        self._student_index_sig = self._index_signature()
+        self.mark_dirty()
         return f"✅ Added {score} for {student_name} in {subject}."
 
     def update_score(self, student_name, subject, new_score):
@@ -164,9 +325,10 @@ class ExcelHandler:
         # Change 'self.sheet' to 'self.ws'
         for row in self.ws.iter_rows(min_row=2, values_only=False):
             if row[0].value == student_name and row[1].value == subject:
+                old_value = row[2].value
                 row[2].value = new_score
-                # Fix: Use correct save method
-                self.wb.save(self.filename)
+                self._record_change(row[2], old_value)
+                self.mark_dirty()
                 return f"🔄 Updated {student_name}'s {subject} score to {new_score}."
         return f"⚠️ No existing score found for {student_name} in {subject}."
 
@@ -180,9 +342,11 @@ class ExcelHandler:
                 self.ws.cell(row=row, column=2).value == subject
             ):
                 # Change 'self.sheet.delete_rows' to 'self.ws.delete_rows'
+                self._ensure_student_index()
                 self.ws.delete_rows(row)
-                # Change 'self.save()' to 'self.wb.save(self.filename)'
-                self.save()
+                self._drop_student_row(row)
+                self._record_reset()
+                self.mark_dirty()
                 return f"🗑️ Deleted {student_name}'s {subject} score."
         return f"⚠️ No score found for {student_name} in {subject}."
 
@@ -210,6 +374,76 @@ class ExcelHandler:
             result += f" - {subject}: {score}\n"
         return result.strip()
 
+    def read_window(self, max_rows=200, max_cols=50, sheet_name=None):
+        """Return the top-left max_rows x max_cols values of a sheet from memory.
+
+        Looks cells up directly instead of using iter_rows/ws.cell, which would
+        create empty cells (and grow the sheet) for every blank in the window.
+        Trailing empty rows and columns are trimmed, like max_row/max_column do.
+        """
+        ws = self.wb[sheet_name] if sheet_name else self.ws
+        cells = ws._cells
+        rows = []
+        used_rows = used_cols = 0
+        for r in range(1, max_rows + 1):
+            row = []
+            for c in range(1, max_cols + 1):
+                cell = cells.get((r, c))
+                value = cell.value if cell is not None else None
+                if value is not None:
+                    used_rows = r
+                    used_cols = max(used_cols, c)
+                row.append(value)
+            rows.append(row)
+        return [row[:used_cols] for row in rows[:used_rows]]
+
+    def read_page(self, row_start, row_count, col_start=1, col_count=50, sheet_name=None):
+        """Values of a rectangular page (1-based start) from memory; cost depends on the page only."""
+        ws = self.wb[sheet_name] if sheet_name else self.ws
+        cells = ws._cells
+        page = []
+        for r in range(row_start, row_start + row_count):
+            row = []
+            for c in range(col_start, col_start + col_count):
+                cell = cells.get((r, c))
+                row.append(cell.value if cell is not None else None)
+            page.append(row)
+        return page
+
+    def sheet_dimensions(self, sheet_name=None):
+        """(rows, columns) up to the last cell holding a value ("" counts as empty, as it
+        does once saved). Scanned once; logged edits then move the bounds themselves."""
+        ws = self.wb[sheet_name] if sheet_name else self.ws
+        cached = self._dimension_cache.get(ws.title)
+        if cached and cached[0] == (id(ws), len(ws._cells)):
+            return cached[1], cached[2]
+        n_rows = n_cols = 0
+        for (r, c), cell in list(ws._cells.items()):
+            if _has_value(cell.value):
+                n_rows = max(n_rows, r)
+                n_cols = max(n_cols, c)
+        self._dimension_cache[ws.title] = [(id(ws), len(ws._cells)), n_rows, n_cols]
+        return n_rows, n_cols
+
+    def _track_dimensions(self, cell):
+        """Keep sheet_dimensions() current after one logged edit without a rescan,
+        unless a cell on the current edge was cleared."""
+        ws = cell.parent
+        cached = self._dimension_cache.get(ws.title)
+        if not cached or cached[0][0] != id(ws):
+            return
+        if _has_value(cell.value):
+            cached[1] = max(cached[1], cell.row)
+            cached[2] = max(cached[2], cell.column)
+        elif cell.row == cached[1] or cell.column == cached[2]:
+            del self._dimension_cache[ws.title]
+            return
+        # An edit creates at most its own cell; any other growth came from direct ws edits
+        if len(ws._cells) - cached[0][1] in (0, 1):
+            cached[0] = (id(ws), len(ws._cells))
+        else:
+            del self._dimension_cache[ws.title]
+
     # ---------------------------
     # New Enhanced Methods
     # ---------------------------
@@ -237,7 +471,8 @@ class ExcelHandler:
         """Load student data for fuzzy matching"""
         student_data = {}
         if self.ws.max_row > 1:  # Skip header row
-            for row_num, row in enumerate(self.ws.iter_rows(min_row=2, values_only=True), start=2):
+            # Only the name column is needed, so don't materialize the rest of the row
+            for row_num, row in enumerate(self.ws.iter_rows(min_row=2, max_col=1, values_only=True), start=2):
                 if row[0]:  # If first column has data
                     student_name = str(row[0]).strip()
                     student_data[student_name.lower()] = {
@@ -246,73 +481,168 @@ class ExcelHandler:
                     }
         return student_data
 
+    def _index_signature(self):
+        """Cheap fingerprint of the file and active sheet, used to spot outside changes.
+
+        openpyxl computes max_row/max_column by walking every cell, so the cell
+        count stands in for the sheet dimensions here.
+        """
+        try:
+            mtime = os.path.getmtime(self.filename)
+        except OSError:
+            mtime = None
+        return (id(self.ws), mtime, len(self.ws._cells))
+
+    def _ensure_student_index(self):
+        """Rebuild the name→row index only when the file or sheet changed underneath us"""
+        signature = self._index_signature()
+        if signature != self._student_index_sig:
+            self.student_data = self._load_student_data()
+            self.name_matcher.rebuild(self.student_data.keys())
+            self._student_index_sig = signature
+        return self.student_data
+
+    def _index_student(self, student_name, row_num):
+        """Add or move one student in the index and the fuzzy matcher"""
+        key = str(student_name).strip().lower()
+        self.student_data[key] = {
+            'name': str(student_name).strip(),
+            'row': row_num
+        }
+        self.name_matcher.add(key)
+
+    def _unindex_student(self, student_name):
+        key = str(student_name).strip().lower()
+        self.student_data.pop(key, None)
+        self.name_matcher.remove(key)
+
+    def invalidate_index(self):
+        """Force a rebuild on next lookup (call after editing self.ws cells directly)"""
+        self._student_index_sig = None
+        self._header_index_sig = None
+
+    def _header_signature(self):
+        """Headers only change through row 1, so fingerprint just that row (and the active sheet)"""
+        cells = self.ws._cells
+        width = len(getattr(self, 'headers', [])) + 1  # one past the end catches a new header
+        row1 = tuple(cells[(1, c)].value if (1, c) in cells else None for c in range(1, width + 1))
+        return (id(self.ws), row1)
+
+    def _ensure_header_index(self):
+        """Build the subject lookups once per header change instead of once per call"""
+        signature = self._header_signature()
+        if signature != self._header_index_sig:
+            self.headers = self._detect_headers()
+            # Exact match: uppercase header → 1-based column (first occurrence wins)
+            self._header_exact = {}
+            for i, header in enumerate(self.headers, 1):
+                self._header_exact.setdefault(header.upper(), i)
+            # Fuzzy candidates, pre-uppercased once
+            self._header_fuzzy = [(header.upper(), header, i) for i, header in enumerate(self.headers, 1)]
+            # Resolved subjects, keyed by (query, threshold)
+            self._subject_cache = OrderedDict()
+            self._header_index_sig = self._header_signature()
+        return self.headers
+
+    def _drop_student_row(self, row_num):
+        """Update the index after a sheet row was deleted (rows below move up by one)"""
+        stale = False
+        for data in self.student_data.values():
+            if data['row'] == row_num:
+                # Another row may carry the same name; let the next lookup rebuild
+                stale = True
+            elif data['row'] > row_num:
+                data['row'] -= 1
+        if stale:
+            self._student_index_sig = None
+        else:
+            self._student_index_sig = self._index_signature()
+
     def find_student_row(self, student_name, threshold=80):
         """Find row number for a student using fuzzy matching"""
-        # Refresh cached data in case the sheet was modified externally
-        self.student_data = self._load_student_data()
+        # Rebuilds only if the sheet was modified externally
+        self._ensure_student_index()
         student_name = student_name.strip()
         
         # First try exact match
-        for name, data in self.student_data.items():
-            if name.lower() == student_name.lower():
-                return data['row']
+        data = self.student_data.get(student_name.lower())
+        if data:
+            return data['row']
         
-        # Then try fuzzy matching
-        best_match = None
-        best_score = 0
-        
-        for name, data in self.student_data.items():
-            score = fuzz.ratio(student_name.lower(), name.lower())
-            if score > best_score and score >= threshold:
-                best_match = data
-                best_score = score
-        
-        if best_match:
-            print(f"🔍 Found student: '{best_match['name']}' (match: {best_score}%)")
+        # Then try fuzzy matching (one batched scorer call over the prebuilt choices)
+        match = self.name_matcher.best(student_name, threshold)
+        if match:
+            key, score = match
+            best_match = self.student_data[key]
+            print(f"🔍 Found student: '{best_match['name']}' (match: {score}%)")
             return best_match['row']
         
         # If no match found, return None
         return None
 
+    def find_student_candidates(self, student_name, limit=5, threshold=60):
+        """Top fuzzy matches for a name, best first: [{'name', 'row', 'score'}, ...].
+        Useful for reporting ambiguous or near-miss names back to the user."""
+        self._ensure_student_index()
+        return [
+            {'name': self.student_data[key]['name'], 'row': self.student_data[key]['row'], 'score': score}
+            for key, score in self.name_matcher.top(student_name, limit=limit, threshold=threshold)
+        ]
+
+    def _match_subject(self, subject_name, threshold=80):
+        """Resolve a subject against the header index -> (column_letter, header, score) or None"""
+        self._ensure_header_index()
+        key = (subject_name.strip().upper(), threshold)
+        if key in self._subject_cache:
+            self._subject_cache.move_to_end(key)
+            return self._subject_cache[key]
+        subject_upper = key[0]
+
+        # First try exact match
+        match = None
+        col = self._header_exact.get(subject_upper)
+        if col:
+            match = (openpyxl.utils.get_column_letter(col), self.headers[col - 1], 100)
+        else:
+            # Then try fuzzy matching
+            best_score = 0
+            for header_upper, header, i in self._header_fuzzy:
+                score = fuzz.ratio(subject_upper, header_upper)
+                if score > best_score and score >= threshold:
+                    match = (openpyxl.utils.get_column_letter(i), header, score)
+                    best_score = score
+
+        # Only hits are kept (misses are whatever STT misheard), and only the recent ones
+        if match:
+            self._subject_cache[key] = match
+            if len(self._subject_cache) > SUBJECT_CACHE_SIZE:
+                self._subject_cache.popitem(last=False)
+        return match
+
     def find_subject_column(self, subject_name, threshold=80):
         """Find column letter for a subject using fuzzy matching"""
-        # Refresh headers in case the sheet was modified externally
-        self.headers = self._detect_headers()
-        subject_name = subject_name.strip().upper()
-        
-        # First try exact match
-        for i, header in enumerate(self.headers, 1):
-            if header.upper() == subject_name:
-                return openpyxl.utils.get_column_letter(i)
-        
-        # Then try fuzzy matching
-        best_match = None
-        best_score = 0
-        
-        for i, header in enumerate(self.headers, 1):
-            score = fuzz.ratio(subject_name, header.upper())
-            if score > best_score and score >= threshold:
-                best_match = (header, i)
-                best_score = score
-        
-        if best_match:
-            print(f"🔍 Found subject: '{best_match[0]}' (match: {best_score}%)")
-            return openpyxl.utils.get_column_letter(best_match[1])
-        
-        return None
+        match = self._match_subject(subject_name, threshold)
+        if not match:
+            return None
+        if match[2] < 100:
+            print(f"🔍 Found subject: '{match[1]}' (match: {match[2]}%)")
+        return match[0]
 
-    def update_cell_value(self, student_name, subject, value):
-        """Update specific cell instead of appending rows"""
-        # Ensure latest headers and student map
-        self.headers = self._detect_headers()
-        self.student_data = self._load_student_data()
-        # Find student row
+    def update_cell_value(self, student_name, subject, value, subject_col=None):
+        """Update specific cell instead of appending rows.
+        Pass subject_col (from resolve_subject) to skip resolving the subject again."""
+        # Find student row (student map is kept current by find_student_row)
         student_row = self.find_student_row(student_name)
         if not student_row:
+            candidates = self.find_student_candidates(student_name, limit=3)
+            if candidates:
+                suggestions = ', '.join(f"{c['name']} ({c['score']}%)" for c in candidates)
+                return f"❌ Student '{student_name}' not found. Did you mean: {suggestions}?"
             return f"❌ Student '{student_name}' not found. Please check the name or add them first."
         
         # Find subject column
-        subject_col = self.find_subject_column(subject)
+        if not subject_col:
+            subject_col = self.find_subject_column(subject)
         if not subject_col:
             return f"❌ Subject '{subject}' not found. Available subjects: {', '.join(self.headers)}"
         
@@ -320,9 +650,17 @@ class ExcelHandler:
         cell = self.ws[f"{subject_col}{student_row}"]
         old_value = cell.value
         cell.value = value
+        self._record_change(cell, old_value)
+
+        # Writing into the name column renames the student in the index
+        if cell.column == 1:
+            self._unindex_student(old_value)
+            if value not in (None, ""):
+                self._index_student(value, student_row)
+        self._student_index_sig = self._index_signature()
         
-        # Save the file
-        self.wb.save(self.filename)
+        # Written by flush() once the command is done
+        self.mark_dirty()
         
         return f"✅ Updated {student_name}'s {subject} from '{old_value}' to '{value}' in cell {subject_col}{student_row}"
 
@@ -332,41 +670,95 @@ class ExcelHandler:
             return False  # Student already exists
         
         # Add new row with student name
+        self._ensure_header_index()
         new_row = [student_name] + [""] * (len(self.headers) - 1)
         self.ws.append(new_row)
+        row_num = self.ws.max_row
+        self._record_change(self.ws.cell(row=row_num, column=1), None)
         
         # Update student data
-        self.student_data[student_name.lower()] = {
-            'name': student_name,
-            'row': self.ws.max_row
-        }
+        self._index_student(student_name, row_num)
+        self._student_index_sig = self._index_signature()
         
-        self.wb.save(self.filename)
+        self.mark_dirty()
         return True
 
+    def apply_cell_edits(self, edits):
+        """Apply [{'sheet', 'cell', 'old', 'new'}, ...] (sheet defaults to the active one).
+        Every 'old' must still match the cell; otherwise nothing is changed and the
+        mismatches come back as [{'sheet', 'cell', 'expected', 'actual'}, ...].
+        Raises ValueError for an unknown sheet, a bad cell reference or a value a cell
+        can't hold; everything is checked before the first cell is touched."""
+        targets, conflicts = [], []
+        for edit in edits:
+            sheet = edit.get('sheet') or self.ws.title
+            if sheet not in self.wb.sheetnames:
+                raise ValueError(f"unknown sheet: {sheet}")
+            ws = self.wb[sheet]
+            try:
+                row, col = coordinate_to_tuple(str(edit['cell']).upper())
+            except (CellCoordinatesException, ValueError):
+                raise ValueError(f"bad cell: {edit['cell']}")
+            if not (1 <= row <= MAX_ROW and 1 <= col <= MAX_COLUMN):
+                raise ValueError(f"bad cell: {edit['cell']}")
+            _check_cell_value(edit['cell'], edit.get('new'))
+            current = ws._cells.get((row, col))
+            actual = current.value if current is not None else None
+            if 'old' in edit and not _same_cell_value(actual, edit['old']):
+                conflicts.append({'sheet': sheet, 'cell': edit['cell'], 'expected': edit['old'], 'actual': actual})
+            targets.append((ws, row, col, edit.get('new')))
+        if conflicts:
+            return conflicts
+
+        for ws, row, col, value in targets:
+            cell = ws.cell(row=row, column=col)
+            old_value = cell.value
+            cell.value = value
+            self._record_change(cell, old_value)
+            if ws is self.ws and col == 1:
+                self._student_index_sig = None  # names changed; rebuild on next lookup
+        if targets:
+            self.mark_dirty()
+        return []
+
+    def resolve_subject(self, subject_name, threshold=80):
+        """Validate a subject and return (column_letter or None, message).
+        Lets callers validate once and reuse the column for the update."""
+        # Headers populated after handler initialization are picked up by the index
+        self._ensure_header_index()
+        if not self.headers:
+            return None, "No headers found in the Excel file"
+
+        match = self._match_subject(subject_name, threshold)
+        if not match:
+            return None, f"Subject '{subject_name}' not found. Available subjects: {', '.join(self.headers)}"
+
+        column, header, score = match
+        if score == 100 and header.upper() == subject_name.strip().upper():
+            return column, f"Subject '{subject_name}' found"
+        return column, f"Subject '{subject_name}' matched with '{header}' ({score}%)"
+
     def validate_subject(self, subject_name, threshold=80):
         """Check if subject exists in headers"""
-        # Refresh headers in case they were populated after handler initialization
-        self.headers = self._detect_headers()
-        if not self.headers:
-            return False, "No headers found in the Excel file"
-        
-        # Try exact match first
-        for header in self.headers:
-            if header.upper() == subject_name.upper():
-                return True, f"Subject '{subject_name}' found"
-        
-        # Try fuzzy match
-        best_match = None
-        best_score = 0
-        
-        for header in self.headers:
-            score = fuzz.ratio(subject_name.upper(), header.upper())
-            if score > best_score and score >= threshold:
-                best_match = header
-                best_score = score
-        
-        if best_match:
-            return True, f"Subject '{subject_name}' matched with '{best_match}' ({best_score}%)"
-        
-        return False, f"Subject '{subject_name}' not found. Available subjects: {', '.join(self.headers)}"
+        column, message = self.resolve_subject(subject_name, threshold)
+        return column is not None, message
+
+
+def _check_cell_value(cell, value):
+    """Raise ValueError if openpyxl would refuse to store value (wrong type, control characters)"""
+    if not isinstance(value, KNOWN_TYPES):
+        raise ValueError(f"bad value for {cell}: {value!r}")
+    if isinstance(value, str) and ILLEGAL_CHARACTERS_RE.search(value):
+        raise ValueError(f"bad value for {cell}: illegal characters")
+
+
+def _has_value(value):
+    return value is not None and value != ""
+
+
+def _same_cell_value(a, b):
+    """Cell values equal for edit checks: blank and "" match, and values that went
+    through JSON (dates as strings, 95 vs 95.0) compare by value or text."""
+    if a in (None, "") and b in (None, ""):
+        return True
+    return a == b or str(a) == str(b)
@@ -0,0 +1,204 @@
+# module_handler_registry.py
+# Open ExcelHandlers for backend/server.py, one per workbook file.
+# Replaces the single global handler that was reloaded from disk whenever another
+# session's file was used: each session's parsed workbook stays hot, every handler
+# has its own CommandQueue (one writer thread, shared reads), and the least recently
+# used one is flushed and closed once more than MAX_OPEN_WORKBOOKS are open.
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Set
+
+from module_command_queue import CommandQueue
+from module_excel_handler import ExcelHandler
+
+MAX_OPEN_WORKBOOKS = 8
+
+
+class _Entry:
+    def __init__(self, handler: ExcelHandler):
+        self.handler = handler
+        self.queue = CommandQueue(os.path.basename(str(handler.filename)))
+        self.sessions: Set[str] = set()
+        self.closed = False
+        # An autosave timer must not save while a command edits; queue its flush instead
+        handler.autosave_submit = self._queue_autosave
+
+    def _queue_autosave(self, flush: Callable[[], bool]) -> None:
+        try:
+            self.queue.submit(flush, exclusive=False)
+        except RuntimeError:
+            pass  # closing, which flushes anyway
+
+
+class HandlerRegistry:
+    """Bounded LRU of open workbooks keyed by file; remembers which sessions use each.
+
+    Handlers are keyed by file rather than by (session, file) so that two sessions
+    opening the same local workbook edit one in-memory copy instead of overwriting
+    each other's saves.
+    """
+
+    def __init__(self, max_open: int = MAX_OPEN_WORKBOOKS,
+                 factory: Optional[Callable[[str], ExcelHandler]] = None):
+        self.max_open = max_open
+        self.factory = factory or ExcelHandler
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._opening: Dict[str, threading.Lock] = {}
+        self._closing: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    @staticmethod
+    def _key(path) -> str:
+        return os.path.abspath(str(path))
+
+    # ---------------------------
+    # Access
+    # ---------------------------
+    def peek(self, path) -> Optional[ExcelHandler]:
+        """The open handler for a file, or None. Never opens or reorders anything."""
+        with self._lock:
+            entry = self._entries.get(self._key(path))
+            return entry.handler if entry is not None else None
+
+    def submit(self, path, session_id: Optional[str], command: Callable[[ExcelHandler], Any],
+               exclusive: bool = True) -> Future:
+        """Queue command(handler) on the file's writer thread (opening it if needed) -> Future.
+        Commands for one file run one at a time, in order; other files aren't held up."""
+        def run(entry: _Entry):
+            if entry.closed:
+                # Evicted after this was queued; replay it on a freshly opened handler
+                return self.submit(path, session_id, command, exclusive).result()
+            return command(entry.handler)
+
+        while True:
+            entry = self._entry(path, session_id)
+            try:
+                return entry.queue.submit(run, entry, exclusive=exclusive)
+            except RuntimeError:
+                continue  # its queue shut down in between; open it again
+
+    @contextmanager
+    def reading(self, path) -> Iterator[Optional[ExcelHandler]]:
+        """Shared read access to a file's open handler for the block, or None if it isn't
+        open (read from disk then). Never opens a workbook; waits only for a running command."""
+        with self._lock:
+            entry = self._entries.get(self._key(path))
+        if entry is None:
+            yield None
+            return
+        with entry.queue.lock.read():
+            yield None if entry.closed else entry.handler
+
+    def _entry(self, path, session_id: Optional[str]) -> _Entry:
+        key = self._key(path)
+        with self._lock:
+            entry = self._use(key, session_id)
+            if entry is not None:
+                return entry
+            opening = self._opening.setdefault(key, threading.Lock())
+
+        # Parse outside the registry lock so other workbooks stay available meanwhile
+        with opening:
+            with self._lock:
+                entry = self._use(key, session_id)
+                if entry is not None:
+                    return entry
+                closing = self._closing.get(key)
+            if closing is not None:
+                closing.result()  # let an evicted copy finish saving before reloading the file
+            entry = _Entry(self.factory(str(path)))
+            with self._lock:
+                self._entries[key] = entry
+                self._use(key, session_id)
+                self._opening.pop(key, None)
+                overflow = []
+                while len(self._entries) > self.max_open:
+                    overflow.append(self._close(*self._entries.popitem(last=False)))
+        self._track_closing(overflow)
+        return entry
+
+    def _use(self, key: str, session_id: Optional[str]) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            if session_id:
+                entry.sessions.add(session_id)
+        return entry
+
+    # ---------------------------
+    # Flushing / closing
+    # ---------------------------
+    def flush(self, path) -> bool:
+        """Write a file's pending edits if it is open -> True if a write happened.
+        Queued behind the file's pending commands, so their edits are included."""
+        with self._lock:
+            entry = self._entries.get(self._key(path))
+        if entry is None:
+            return False
+        try:
+            return entry.queue.submit(entry.handler.flush, exclusive=False).result()
+        except RuntimeError:
+            return False  # closed meanwhile, which flushes
+
+    def discard(self, path) -> None:
+        """Flush and close one file's handler; returns once it is saved."""
+        key = self._key(path)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            closing = [self._close(key, entry)] if entry is not None else []
+        for _, future in self._track_closing(closing):
+            future.result()
+
+    def release_session(self, session_id: str) -> None:
+        """A session ended: close the handlers no other session is using."""
+        closing = []
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                entry.sessions.discard(session_id)
+                if not entry.sessions:
+                    closing.append(self._close(key, self._entries.pop(key)))
+        for _, future in self._track_closing(closing):
+            future.result()
+
+    def close_all(self) -> None:
+        with self._lock:
+            closing = [self._close(key, entry) for key, entry in self._entries.items()]
+            self._entries.clear()
+        for _, future in self._track_closing(closing):
+            future.result()
+
+    def _close(self, key: str, entry: _Entry):
+        """Queue the close behind the handler's pending commands, so their edits are saved too.
+        Called with _lock held, in the same step that removes the entry: _entry() must
+        never see the file as neither open nor closing, or it would reload a stale copy.
+        -> (key, future) for _track_closing() once the lock is released."""
+        def close():
+            entry.closed = True
+            try:
+                entry.handler.close()
+            except Exception as e:
+                print(f"⚠️ Could not save {entry.handler.filename} while closing it: {e}")
+
+        future = entry.queue.submit(close)
+        entry.queue.shutdown()
+        self._closing[key] = future
+        return key, future
+
+    def _track_closing(self, closing):
+        # Outside _lock: a callback on an already finished future runs right here
+        for key, future in closing:
+            future.add_done_callback(lambda f, key=key: self._forget_closing(key, f))
+        return closing
+
+    def _forget_closing(self, key: str, future: Future) -> None:
+        with self._lock:
+            if self._closing.get(key) is future:
+                del self._closing[key]
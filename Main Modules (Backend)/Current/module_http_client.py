@@ -0,0 +1,49 @@
+# module_http_client.py
+# Shared keep-alive HTTP client for main.py's calls to the preview server and the controller.
+# One requests.Session per process keeps connections pooled and reused instead of
+# opening a new TCP connection per call, and retries transient failures with backoff.
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+HTTP_RETRIES = 3
+HTTP_BACKOFF = 0.3              # seconds; grows 0.3, 0.6, 1.2 between retries
+HTTP_POOL_SIZE = 4              # keep-alive connections kept per host
+RETRY_STATUSES = (502, 503, 504)
+
+_sessions = {}
+_lock = threading.Lock()
+
+
+def make_session(retries: int = HTTP_RETRIES, backoff: float = HTTP_BACKOFF,
+                 pool_size: int = HTTP_POOL_SIZE) -> requests.Session:
+    """New pooled session. Connection errors are retried for every method (the request
+    never reached the server); read errors and 5xx only for idempotent ones."""
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUSES,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session(retry: bool = True) -> requests.Session:
+    """Process-wide session. retry=False gives a pooled session that fails fast,
+    for "is the server up yet?" probes that have their own wait loop."""
+    with _lock:
+        session = _sessions.get(retry)
+        if session is None:
+            session = make_session() if retry else make_session(retries=0)
+            _sessions[retry] = session
+        return session
@@ -0,0 +1,157 @@
+# module_name_matcher.py
+# Fuzzy student-name resolution for ExcelHandler.
+# Keeps the (lowercased) names in one prebuilt choice list and scores them in a
+# single rapidfuzz call instead of a Python loop over fuzz.ratio.
+# A Soundex bucket index narrows STT misspellings ("Pria", "Prya" -> "Priya")
+# to a handful of candidates that are scored first; the full roster is scored
+# only when none of them clears the threshold.
+
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    from rapidfuzz import fuzz, process
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:  # fall back to the slower pure loop
+    from fuzzywuzzy import fuzz
+    process = None
+    RAPIDFUZZ_AVAILABLE = False
+
+_SOUNDEX_CODES = {}
+for _letters, _digit in (("bfpv", "1"), ("cgjkqsxz", "2"), ("dt", "3"), ("l", "4"), ("mn", "5"), ("r", "6")):
+    for _ch in _letters:
+        _SOUNDEX_CODES[_ch] = _digit
+
+
+def soundex(word: str) -> str:
+    """American Soundex code ("priya", "pria", "prya" -> "P600"); "" for non-letters."""
+    letters = [ch for ch in word.lower() if ch.isalpha()]
+    if not letters:
+        return ""
+    code = letters[0].upper()
+    prev = _SOUNDEX_CODES.get(letters[0], "")
+    for ch in letters[1:]:
+        digit = _SOUNDEX_CODES.get(ch, "")
+        if digit and digit != prev:
+            code += digit
+            if len(code) == 4:
+                break
+        # h/w don't separate equal codes; vowels do
+        if ch not in "hw":
+            prev = digit
+    return code.ljust(4, "0")
+
+
+def phonetic_keys(name: str) -> Set[str]:
+    """Soundex of each word, so "priya" also finds "priya sharma"."""
+    return {code for code in (soundex(word) for word in name.split()) if code}
+
+
+class NameMatcher:
+    """Prebuilt choice list of student name keys with batched fuzzy scoring."""
+
+    def __init__(self, names: Iterable[str] = ()):
+        self._choices: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._buckets: Dict[str, Set[str]] = {}
+        self.rebuild(names)
+
+    def __len__(self) -> int:
+        return len(self._choices)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._positions
+
+    # ---------------------------
+    # Maintenance
+    # ---------------------------
+    def rebuild(self, names: Iterable[str]) -> None:
+        """Replace all choices (names are expected lowercased/stripped already)."""
+        self._choices = []
+        self._positions = {}
+        self._buckets = {}
+        for key in names:
+            self.add(key)
+
+    def add(self, key: str) -> None:
+        if key in self._positions:
+            return
+        self._positions[key] = len(self._choices)
+        self._choices.append(key)
+        for code in phonetic_keys(key):
+            self._buckets.setdefault(code, set()).add(key)
+
+    def remove(self, key: str) -> None:
+        """O(1) removal: move the last choice into the freed slot."""
+        pos = self._positions.pop(key, None)
+        if pos is None:
+            return
+        for code in phonetic_keys(key):
+            bucket = self._buckets.get(code)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[code]
+        last = self._choices.pop()
+        if pos < len(self._choices):
+            self._choices[pos] = last
+            self._positions[last] = pos
+
+    # ---------------------------
+    # Lookups
+    # ---------------------------
+    def best(self, query: str, threshold: int = 80) -> Optional[Tuple[str, int]]:
+        """Best choice scoring >= threshold -> (key, score) or None.
+
+        Names that sound like the query are scored first, and the best of them is
+        returned as soon as it reaches the threshold; the whole roster is only scanned
+        when no phonetic candidate does. The threshold is never lowered: a name that
+        only sounds alike is a different student (see find_student_candidates).
+        """
+        query = query.strip().lower()
+        if not query or not self._choices:
+            return None
+
+        candidates = self.phonetic_candidates(query)
+        if candidates:
+            found = self._best_in(query, candidates, threshold)
+            if found:
+                return found
+        return self._best_in(query, self._choices, threshold)
+
+    def phonetic_candidates(self, query: str) -> List[str]:
+        """Keys sharing a Soundex bucket with the query, in roster order."""
+        found: Set[str] = set()
+        for code in phonetic_keys(query.strip().lower()):
+            found |= self._buckets.get(code, set())
+        return sorted(found, key=self._positions.__getitem__)
+
+    def _best_in(self, query: str, choices: List[str], threshold: float) -> Optional[Tuple[str, int]]:
+        if RAPIDFUZZ_AVAILABLE:
+            # score_cutoff lets rapidfuzz skip hopeless choices early
+            match = process.extractOne(query, choices, scorer=fuzz.ratio,
+                                       processor=None, score_cutoff=threshold)
+            if match is None:
+                return None
+            return match[0], int(round(match[1]))
+
+        best_key, best_score = None, 0
+        for key in choices:
+            score = fuzz.ratio(query, key)
+            if score > best_score and score >= threshold:
+                best_key, best_score = key, score
+        return (best_key, best_score) if best_key is not None else None
+
+    def top(self, query: str, limit: int = 5, threshold: int = 0) -> List[Tuple[str, int]]:
+        """Top `limit` choices scoring >= threshold, best first -> [(key, score), ...]."""
+        query = query.strip().lower()
+        if not query or not self._choices:
+            return []
+        if RAPIDFUZZ_AVAILABLE:
+            matches = process.extract(query, self._choices, scorer=fuzz.ratio,
+                                      processor=None, limit=limit, score_cutoff=threshold)
+            return [(key, int(round(score))) for key, score, _ in matches]
+
+        scored = [(key, fuzz.ratio(query, key)) for key in self._choices]
+        scored = [m for m in scored if m[1] >= threshold]
+        scored.sort(key=lambda m: m[1], reverse=True)
+        return scored[:limit]
@@ -185,8 +185,8 @@ def parse_command(command: str, excel_instance = None):
                 speak("❌ No subject specified. Please specify a subject like 'Math', 'Science', etc.")
                 return merged
                 
-            subject_valid, subject_msg = excel_instance.validate_subject(subject)
-            if not subject_valid:
+            subject_col, subject_msg = excel_instance.resolve_subject(subject)
+            if not subject_col:
                 speak(f"❌ {subject_msg}")
                 return merged
             
@@ -194,7 +194,7 @@ def parse_command(command: str, excel_instance = None):
             excel_instance.add_student_if_not_exists(name)
             
             # Use cell-specific update
-            result = excel_instance.update_cell_value(name, subject, value)
+            result = excel_instance.update_cell_value(name, subject, value, subject_col=subject_col)
             speak(result)
         except Exception as e:
             print(f"❌ Error in add operation: {e}")
@@ -202,31 +202,31 @@ def parse_command(command: str, excel_instance = None):
 
     elif action in ["update", "change"]:
         # First validate subject exists
-        subject_valid, subject_msg = excel_instance.validate_subject(subject)
-        if not subject_valid:
+        subject_col, subject_msg = excel_instance.resolve_subject(subject)
+        if not subject_col:
             speak(f"❌ {subject_msg}")
             return merged
         
         # Use cell-specific update
-        result = excel_instance.update_cell_value(name, subject, value)
+        result = excel_instance.update_cell_value(name, subject, value, subject_col=subject_col)
         speak(result)
 
     elif action in ["delete", "remove"]:
         # First validate subject exists
-        subject_valid, subject_msg = excel_instance.validate_subject(subject)
-        if not subject_valid:
+        subject_col, subject_msg = excel_instance.resolve_subject(subject)
+        if not subject_col:
             speak(f"❌ {subject_msg}")
             return merged
         
         # Use cell-specific update to clear the value
-        result = excel_instance.update_cell_value(name, subject, "")
+        result = excel_instance.update_cell_value(name, subject, "", subject_col=subject_col)
         speak(f"🗑️ Cleared {name}'s {subject} value")
 
     elif action in ["get", "collect"]:
         if subject:
             # First validate subject exists
-            subject_valid, subject_msg = excel_instance.validate_subject(subject)
-            if not subject_valid:
+            subject_col, subject_msg = excel_instance.resolve_subject(subject)
+            if not subject_col:
                 speak(f"❌ {subject_msg}")
                 return merged
             
@@ -236,11 +236,6 @@ def parse_command(command: str, excel_instance = None):
                 speak(f"❌ Student '{name}' not found")
                 return merged
             
-            subject_col = excel_instance.find_subject_column(subject)
-            if not subject_col:
-                speak(f"❌ Subject '{subject}' not found")
-                return merged
-            
             cell_value = excel_instance.ws[f"{subject_col}{student_row}"].value
             speak(f"📊 {name}'s {subject}: {cell_value if cell_value else 'No value'}")
         else:
@@ -252,8 +247,8 @@ def parse_command(command: str, excel_instance = None):
             speak("❌ No subject specified. Please specify a subject like 'Math', 'Science', etc.")
             return merged
             
-        subject_valid, subject_msg = excel_instance.validate_subject(subject)
-        if not subject_valid:
+        subject_col, subject_msg = excel_instance.resolve_subject(subject)
+        if not subject_col:
             speak(f"❌ {subject_msg}")
             return merged
         
@@ -263,11 +258,6 @@ def parse_command(command: str, excel_instance = None):
             speak(f"❌ Student '{name}' not found")
             return merged
         
-        subject_col = excel_instance.find_subject_column(subject)
-        if not subject_col:
-            speak(f"❌ Subject '{subject}' not found")
-            return merged
-        
         current_value = excel_instance.ws[f"{subject_col}{student_row}"].value
         if current_value is None:
             current_value = 0
@@ -278,7 +268,7 @@ def parse_command(command: str, excel_instance = None):
                 current_value = 0
         
         new_value = current_value - value
-        result = excel_instance.update_cell_value(name, subject, new_value)
+        result = excel_instance.update_cell_value(name, subject, new_value, subject_col=subject_col)
         speak(f"➖ Subtracted {value} from {name}'s {subject}. New value: {new_value}")
 
     elif action in ["insert", "create"]:
@@ -287,8 +277,8 @@ def parse_command(command: str, excel_instance = None):
             speak("❌ No subject specified. Please specify a subject like 'Math', 'Science', etc.")
             return merged
             
-        subject_valid, subject_msg = excel_instance.validate_subject(subject)
-        if not subject_valid:
+        subject_col, subject_msg = excel_instance.resolve_subject(subject)
+        if not subject_col:
             speak(f"❌ {subject_msg}")
             return merged
         
@@ -296,7 +286,7 @@ def parse_command(command: str, excel_instance = None):
         excel_instance.add_student_if_not_exists(name)
         
         # Use cell-specific update
-        result = excel_instance.update_cell_value(name, subject, value)
+        result = excel_instance.update_cell_value(name, subject, value, subject_col=subject_col)
         speak(f"➕ Inserted {value} for {name} in {subject}")
 
     elif action == "rename":
@@ -313,8 +303,8 @@ def parse_command(command: str, excel_instance = None):
             speak("❌ No subject specified. Please specify a subject like 'Math', 'Science', etc.")
             return merged
             
-        subject_valid, subject_msg = excel_instance.validate_subject(subject)
-        if not subject_valid:
+        subject_col, subject_msg = excel_instance.resolve_subject(subject)
+        if not subject_col:
             speak(f"❌ {subject_msg}")
             return merged
         
@@ -322,7 +312,7 @@ def parse_command(command: str, excel_instance = None):
         excel_instance.add_student_if_not_exists(name)
         
         # Use cell-specific update
-        result = excel_instance.update_cell_value(name, subject, value)
+        result = excel_instance.update_cell_value(name, subject, value, subject_col=subject_col)
         speak(f"🔧 Set {name}'s {subject} to {value}")
 
     else:
@@ -0,0 +1,212 @@
+# module_profile_store.py
+# Binary voice profile storage for module_speaker_id, replacing voice_profiles.json.
+#
+#   data/profiles/index.json         names -> row, samples, updated_at (+ count, generation)
+#   data/profiles/embeddings-<n>.npy (capacity, dim) float32 matrix, opened with mmap
+#
+# Opening the store reads the small index and maps the matrix, so no embedding is
+# parsed however many speakers are enrolled. Updating a speaker writes its row in
+# place; adding one fills the next spare row and only becomes visible when the index
+# is atomically replaced. When the spare rows run out the matrix is copied into a new,
+# larger file (new name, so processes still mapping the old one are unaffected).
+
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+INDEX_NAME = "index.json"
+EMBEDDING_DIM = 256        # Resemblyzer embedding size
+INITIAL_CAPACITY = 64      # rows reserved in a new matrix; doubled when full
+
+
+class ProfileStore:
+    """Speaker name -> embedding row in a memory-mapped float32 matrix."""
+
+    def __init__(self, root, dim: int = EMBEDDING_DIM, sample_rate: int = 16000):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.root / INDEX_NAME
+        self.index = {"version": 2, "dim": dim, "sample_rate": sample_rate, "matrix": None,
+                      "count": 0, "generation": 0, "users": {}}
+        self._matrix: Optional[np.memmap] = None
+        self._signature = None
+        self._load()
+
+    def _load(self) -> None:
+        if self.index_path.exists():
+            self._signature = _file_signature(self.index_path)
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self.index = json.load(f)
+        self.dim = int(self.index["dim"])
+        if self.index["matrix"] and (self._matrix is None or Path(self._matrix.filename).name != self.index["matrix"]):
+            self._matrix = np.load(self.root / self.index["matrix"], mmap_mode="r+")
+
+    def refresh(self) -> bool:
+        """Re-read the index if another process committed since we last did -> True if it changed.
+        One stat() call when nothing changed."""
+        if _file_signature(self.index_path) == self._signature:
+            return False
+        self._load()
+        return True
+
+    @classmethod
+    def exists(cls, root) -> bool:
+        return (Path(root) / INDEX_NAME).exists()
+
+    # ---------------------------
+    # Reading
+    # ---------------------------
+    @property
+    def generation(self) -> int:
+        """Bumped by every committed write; lets callers tell whether their copy is stale."""
+        return int(self.index["generation"])
+
+    def __len__(self) -> int:
+        return len(self.index["users"])
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index["users"]
+
+    def names(self) -> List[str]:
+        """Names in row order, matching matrix()."""
+        names = [""] * self.index["count"]
+        for name, meta in self.index["users"].items():
+            names[meta["row"]] = name
+        return names
+
+    def matrix(self) -> np.ndarray:
+        """(count, dim) view of the live rows, in names() order."""
+        if self._matrix is None:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return self._matrix[: self.index["count"]]
+
+    def get(self, name: str) -> Optional[np.ndarray]:
+        meta = self.index["users"].get(name)
+        if meta is None:
+            return None
+        return np.array(self._matrix[meta["row"]], dtype=np.float32)
+
+    def meta(self, name: str) -> Optional[Dict]:
+        meta = self.index["users"].get(name)
+        return dict(meta) if meta is not None else None
+
+    # ---------------------------
+    # Writing
+    # ---------------------------
+    def put(self, name: str, embedding: np.ndarray, samples: Optional[int] = None,
+            samples_inc: int = 0, commit: bool = True) -> None:
+        """Store a speaker's embedding: in place if known, else appended.
+        samples replaces the sample count; samples_inc adds to it. With commit=False
+        the index is written by a later commit() (bulk imports)."""
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(self.dim)
+        users = self.index["users"]
+        meta = users.get(name)
+        if meta is None:
+            row = self.index["count"]
+            self._reserve(row + 1)
+            meta = {"row": row, "samples": 0}
+        self._matrix[meta["row"]] = embedding
+        self._matrix.flush()
+
+        meta = dict(meta)
+        meta["samples"] = int(samples if samples is not None else meta.get("samples", 0)) + samples_inc
+        meta["updated_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        users[name] = meta
+        self.index["count"] = max(self.index["count"], meta["row"] + 1)
+        if commit:
+            self.commit()
+
+    def remove(self, name: str) -> bool:
+        """Drop a speaker; the last row moves into its slot so rows stay contiguous."""
+        users = self.index["users"]
+        meta = users.pop(name, None)
+        if meta is None:
+            return False
+        last = self.index["count"] - 1
+        if meta["row"] != last:
+            moved = next(n for n, m in users.items() if m["row"] == last)
+            self._matrix[meta["row"]] = self._matrix[last]
+            self._matrix.flush()
+            users[moved] = dict(users[moved], row=meta["row"])
+        self.index["count"] = last
+        self.commit()
+        return True
+
+    def clear(self) -> None:
+        self.index["users"] = {}
+        self.index["count"] = 0
+        self.commit()
+
+    def _reserve(self, rows: int) -> None:
+        """Make sure the matrix has at least `rows` rows, moving to a bigger file if not."""
+        capacity = 0 if self._matrix is None else self._matrix.shape[0]
+        if rows <= capacity:
+            return
+        new_capacity = max(INITIAL_CAPACITY, capacity * 2, rows)
+        name = f"embeddings-{new_capacity}.npy"  # capacity only grows, so names never repeat
+        grown = np.lib.format.open_memmap(self.root / name, mode="w+", dtype=np.float32,
+                                          shape=(new_capacity, self.dim))
+        count = self.index["count"]
+        if count:
+            grown[:count] = self._matrix[:count]
+        grown.flush()
+        # Only takes effect for readers once the index naming it is committed
+        self._matrix = grown
+        self.index["matrix"] = name
+
+    def commit(self) -> None:
+        """Atomically replace the index; this is what makes appends and moves visible."""
+        self.index["generation"] = self.generation + 1
+        fd, tmp_path = tempfile.mkstemp(prefix=".~index-", dir=self.root)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.index, f)
+            os.replace(tmp_path, self.index_path)
+            self._signature = _file_signature(self.index_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        for path in self.root.glob("embeddings-*.npy"):
+            if path.name != self.index["matrix"]:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass  # still mapped by another process (Windows); retried on a later commit
+
+
+def _file_signature(path: Path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    # A replaced index is a new inode, so this changes even within one mtime tick
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def migrate_legacy(store: ProfileStore, profile_json: Path, embeddings_dir: Path) -> int:
+    """Import voice_profiles.json, plus the per-sample embeddings/<name>/*.npy files
+    (averaged) of speakers missing from it. Legacy files are left in place -> speakers added."""
+    added = 0
+    if profile_json.exists():
+        with open(profile_json, "r", encoding="utf-8") as f:
+            users = json.load(f).get("users", {})
+        for name, meta in users.items():
+            if name not in store and meta.get("embedding"):
+                store.put(name, np.array(meta["embedding"], dtype=np.float32),
+                          samples=int(meta.get("samples", 1)), commit=False)
+                added += 1
+    if embeddings_dir.exists():
+        for user_dir in sorted(p for p in embeddings_dir.iterdir() if p.is_dir()):
+            if user_dir.name in store:
+                continue
+            samples = [np.load(p) for p in sorted(user_dir.glob("*.npy"))]
+            if samples:
+                store.put(user_dir.name, np.mean(np.stack(samples), axis=0), samples=len(samples), commit=False)
+                added += 1
+    store.commit()
+    return added
@@ -0,0 +1,143 @@
+# module_session_manager.py
+# Bounded session table for backend/server.py.
+# Behaves like the plain dict it replaces (sessions[sid], sid in sessions, ...)
+# but forgets sessions idle for longer than a TTL, caps how many exist at once
+# (least recently used goes first) and runs a background reaper, so a server
+# that stays up for weeks keeps flat memory and disk use.
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+SESSION_TTL_SECONDS = 2 * 60 * 60   # idle time before a session expires
+MAX_SESSIONS = 100                  # live sessions before the least recently used is evicted
+REAP_INTERVAL_SECONDS = 60          # how often the reaper looks for expired sessions
+
+
+class SessionManager:
+    """Session id -> session data, kept in least-recently-used order.
+
+    Reading a session (sessions[sid], get, touch) marks it as used. on_evict(sid, data)
+    is called outside the lock for every session that expires or is pushed out, so
+    callers can delete its files there.
+    """
+
+    def __init__(self, ttl_seconds: float = SESSION_TTL_SECONDS, max_sessions: int = MAX_SESSIONS,
+                 reap_interval: float = REAP_INTERVAL_SECONDS,
+                 on_evict: Optional[Callable[[str, Dict], None]] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.reap_interval = reap_interval
+        self.on_evict = on_evict
+        self._sessions: "OrderedDict[str, Tuple[Dict, float]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._reaper: Optional[threading.Thread] = None
+
+    # ---------------------------
+    # dict-style access
+    # ---------------------------
+    def __contains__(self, session_id) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    def __getitem__(self, session_id: str) -> Dict:
+        with self._lock:
+            data, _ = self._sessions[session_id]
+            self._sessions[session_id] = (data, time.monotonic())
+            self._sessions.move_to_end(session_id)
+            return data
+
+    def __setitem__(self, session_id: str, data: Dict) -> None:
+        with self._lock:
+            self._sessions[session_id] = (data, time.monotonic())
+            self._sessions.move_to_end(session_id)
+            overflow = []
+            while len(self._sessions) > self.max_sessions:
+                old_id, (old_data, _) = self._sessions.popitem(last=False)
+                overflow.append((old_id, old_data))
+        self._evicted(overflow)
+
+    def __delitem__(self, session_id: str) -> None:
+        self.pop(session_id)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return list(self._sessions)
+
+    def items(self) -> List[Tuple[str, Dict]]:
+        """Snapshot of (session id, data); does not count as use."""
+        with self._lock:
+            return [(sid, data) for sid, (data, _) in self._sessions.items()]
+
+    def get(self, session_id: str, default=None):
+        try:
+            return self[session_id]
+        except KeyError:
+            return default
+
+    def touch(self, session_id: str) -> bool:
+        """Mark a session as used (e.g. while a preview stream is open) -> False if it is gone."""
+        return self.get(session_id) is not None
+
+    def pop(self, session_id: str, default=None, evict: bool = True) -> Any:
+        """Remove a session; on_evict runs for it unless evict=False."""
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+        if entry is None:
+            return default
+        if evict:
+            self._evicted([(session_id, entry[0])])
+        return entry[0]
+
+    # ---------------------------
+    # Expiry
+    # ---------------------------
+    def reap(self) -> List[str]:
+        """Evict every session idle for longer than the TTL -> evicted ids."""
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = []
+        with self._lock:
+            # Least recently used first, so stop at the first live one
+            for session_id, (data, last_seen) in list(self._sessions.items()):
+                if last_seen > cutoff:
+                    break
+                del self._sessions[session_id]
+                expired.append((session_id, data))
+        self._evicted(expired)
+        return [session_id for session_id, _ in expired]
+
+    def start_reaper(self) -> None:
+        """Run reap() every reap_interval seconds on a daemon thread (idempotent)."""
+        if self._reaper is not None and self._reaper.is_alive():
+            return
+        self._stop.clear()
+        self._reaper = threading.Thread(target=self._reap_loop, name="session-reaper", daemon=True)
+        self._reaper.start()
+
+    def stop_reaper(self) -> None:
+        self._stop.set()
+
+    def _reap_loop(self) -> None:
+        while not self._stop.wait(self.reap_interval):
+            try:
+                self.reap()
+            except Exception as e:
+                print(f"⚠️ Session reaper failed: {e}")
+
+    def _evicted(self, entries: List[Tuple[str, Dict]]) -> None:
+        if self.on_evict is None:
+            return
+        for session_id, data in entries:
+            try:
+                self.on_evict(session_id, data)
+            except Exception as e:
+                print(f"⚠️ Cleanup of session {session_id} failed: {e}")
@@ -0,0 +1,307 @@
+# module_sheet_reader.py
+# Read-only helpers for the preview/table endpoints.
+# Opens workbooks in openpyxl's streaming (read_only) mode and pulls just the
+# requested window of rows, instead of parsing the whole file into memory.
+# Parsed windows are kept in a small LRU cache keyed by (path, mtime, size),
+# so repeated polls of an unchanged workbook never touch the xlsx again.
+# Table pages come from a per-file-version row-offset index into the sheet XML,
+# so any page is parsed from its own rows only, whatever its offset.
+
+import io
+import os
+import re
+import sys
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+import openpyxl
+from openpyxl.utils.cell import column_index_from_string
+from openpyxl.worksheet._reader import WorkSheetParser
+
+SNAPSHOT_CACHE_BYTES = 64 * 1024 * 1024  # memory budget for cached windows/snapshots
+
+
+def read_sheet_window(path: str, max_rows: int = 200, max_cols: int = 50,
+                      sheet_name: Optional[str] = None) -> List[List[Any]]:
+    """Return up to max_rows x max_cols cell values (row 1 first) from one sheet.
+
+    Defaults to the first sheet. Rows are streamed with iter_rows(values_only=True)
+    and reading stops as soon as the window is filled.
+    """
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name] if sheet_name else wb[wb.sheetnames[0]]
+
+        # Files written by openpyxl/Excel carry a <dimension>, others may not
+        width = min(ws.max_column, max_cols) if ws.max_column else max_cols
+        rows: List[List[Any]] = []
+        if width < 1:
+            return rows
+        for row in ws.iter_rows(min_row=1, max_row=max_rows, max_col=width, values_only=True):
+            rows.append(list(row) + [None] * (width - len(row)))
+            if len(rows) >= max_rows:
+                break
+
+        if not ws.max_column:
+            # Unsized sheet: drop the padding columns that never held a value
+            used = max((i + 1 for r in rows for i, v in enumerate(r) if v is not None), default=0)
+            rows = [r[:used] for r in rows]
+        return rows
+    finally:
+        # read_only workbooks keep the zip open until closed
+        wb.close()
+
+
+class SheetPage:
+    """One page of a sheet: its header row, the requested rows, and the sheet's size."""
+
+    def __init__(self, header: List[Any], rows: List[List[Any]], n_rows: int, n_cols: int,
+                 sheet_name: str, sheetnames: List[str]):
+        self.header = header
+        self.rows = rows
+        self.n_rows = n_rows
+        self.n_cols = n_cols
+        self.sheet_name = sheet_name
+        self.sheetnames = sheetnames
+
+
+class _PagedSheet:
+    n_rows: int
+    n_cols: int
+    sheet_name: str
+    sheetnames: List[str]
+
+    def rows(self, row_start: int, row_count: int, col_start: int, col_count: int) -> List[List[Any]]:
+        raise NotImplementedError
+
+    def page(self, row_start: int, row_count: int, col_start: int, col_count: int) -> SheetPage:
+        header = (self.rows(1, 1, col_start, col_count) or [[None] * col_count])[0]
+        return SheetPage(header, self.rows(row_start, row_count, col_start, col_count),
+                         self.n_rows, self.n_cols, self.sheet_name, self.sheetnames)
+
+
+class SheetIndex(_PagedSheet):
+    """Row-offset index over one sheet's XML, built once per file version.
+
+    Keeps the sheet XML plus the byte offset of every <row>, so a page is parsed
+    from just its own slice of the XML whatever its offset. n_rows/n_cols bound
+    the cells holding a value, the same way ExcelHandler.sheet_dimensions counts
+    (formatted empty cells and a stale <dimension> don't make the sheet bigger).
+    """
+
+    def __init__(self, xml: bytes, prefix: bytes, open_tag: bytes, row_numbers: array, row_offsets: array,
+                 data_end: int, n_rows: int, n_cols: int, sheet_name: str, sheetnames: List[str], parser_args: dict):
+        self.xml = xml
+        self.prefix = prefix
+        self.open_tag = open_tag
+        self.row_numbers = row_numbers
+        self.row_offsets = row_offsets
+        self.data_end = data_end
+        self.n_rows = n_rows
+        self.n_cols = n_cols
+        self.sheet_name = sheet_name
+        self.sheetnames = sheetnames
+        self.parser_args = parser_args
+
+    @property
+    def size(self) -> int:
+        return (len(self.xml) + self.row_numbers.itemsize * len(self.row_numbers) * 2
+                + _estimate_size([self.parser_args["shared_strings"]]))
+
+    def rows(self, row_start: int, row_count: int, col_start: int, col_count: int) -> List[List[Any]]:
+        """Values of rows [row_start, row_start + row_count), blank rows included (1-based)."""
+        last = min(row_start + row_count - 1, self.n_rows)
+        if last < row_start:
+            return []
+        first = bisect_left(self.row_numbers, row_start)
+        stop = bisect_right(self.row_numbers, last)
+        out = [[None] * col_count for _ in range(last - row_start + 1)]
+        if first == stop:
+            return out
+        end = self.row_offsets[stop] if stop < len(self.row_offsets) else self.data_end
+        p = self.prefix
+        source = io.BytesIO(self.open_tag + b"<" + p + b"sheetData>" + self.xml[self.row_offsets[first]:end]
+                            + b"</" + p + b"sheetData></" + p + b"worksheet>")
+        for number, cells in WorkSheetParser(source, **self.parser_args).parse():
+            row = out[number - row_start]
+            for cell in cells:
+                col = cell["column"] - col_start
+                if 0 <= col < col_count:
+                    row[col] = cell["value"]
+        return out
+
+
+class SheetRows(_PagedSheet):
+    """Fallback for sheets SheetIndex can't index (rows without an r attribute):
+    every row parsed once, with the same interface."""
+
+    def __init__(self, values: List[Tuple[Any, ...]], sheet_name: str, sheetnames: List[str]):
+        self.values = values
+        self.n_rows = max((i + 1 for i, row in enumerate(values) if any(_has_value(v) for v in row)), default=0)
+        self.n_cols = max((c + 1 for row in values for c, v in enumerate(row) if _has_value(v)), default=0)
+        self.sheet_name = sheet_name
+        self.sheetnames = sheetnames
+
+    @property
+    def size(self) -> int:
+        return _estimate_size(self.values)
+
+    def rows(self, row_start: int, row_count: int, col_start: int, col_count: int) -> List[List[Any]]:
+        last = min(row_start + row_count - 1, self.n_rows)
+        out = []
+        for row in self.values[row_start - 1:max(row_start - 1, last)]:
+            values = list(row[col_start - 1:col_start - 1 + col_count])
+            out.append(values + [None] * (col_count - len(values)))
+        return out
+
+
+def read_sheet_index(path: str, sheet_name: Optional[str] = None):
+    """Build a SheetIndex for one sheet (a SheetRows if its XML can't be indexed).
+
+    One decompression and a few regex passes over the XML; only the fallback runs
+    openpyxl's cell parser over the whole sheet.
+    """
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name] if sheet_name else wb[wb.sheetnames[0]]
+        with ws._get_source() as src:
+            xml = src.read()
+        parser_args = {"shared_strings": ws._shared_strings, "data_only": True, "epoch": wb.epoch,
+                       "date_formats": wb._date_formats, "timedelta_formats": wb._timedelta_formats}
+        index = _index_xml(xml, ws.title, list(wb.sheetnames), parser_args)
+        if index is None:
+            index = SheetRows([tuple(row) for row in ws.iter_rows(values_only=True)], ws.title, list(wb.sheetnames))
+        return index
+    finally:
+        wb.close()
+
+
+def _index_xml(xml: bytes, sheet_name: str, sheetnames: List[str], parser_args: dict) -> Optional[SheetIndex]:
+    root = re.search(rb"<(?:(\w+):)?worksheet\b[^>]*>", xml)
+    if root is None:
+        return None
+    p = root.group(1) + b":" if root.group(1) else b""
+    data = re.compile(rb"<" + p + rb"sheetData\b[^>]*?(/?)>").search(xml, root.end())
+    if data is None:
+        return None
+    numbers, offsets = array("l"), array("q")
+    n_rows = n_cols = 0
+    if not data.group(1):  # not an empty <sheetData/>
+        data_end = xml.find(b"</" + p + b"sheetData>", data.end())
+        if data_end < 0:
+            return None
+        body = (data.end(), data_end)
+        for match in re.compile(rb"<" + p + rb"row\b[^>]*?\br=\"(\d+)\"").finditer(xml, *body):
+            numbers.append(int(match.group(1)))
+            offsets.append(match.start())
+        if len(re.compile(rb"<" + p + rb"row\b").findall(xml, *body)) != len(numbers):
+            return None  # a row without r: only a full parse knows its number
+        if re.compile(rb"<" + p + rb"c(?:\s(?![^>]*\br=)[^>]*)?>").search(xml, *body):
+            return None  # a cell without r: only a full parse knows its column
+        value_cells = re.compile(
+            rb"<" + p + rb"c\b[^>]*?\br=\"([A-Z]+)(\d+)\"[^>]*(?<!/)>\s*"
+            rb"(?:<" + p + rb"f\b[^>]*/>|<" + p + rb"f\b[^>]*>[^<]*</" + p + rb"f>)?\s*<" + p + rb"(?:v|is)\b"
+        ).findall(xml, *body)
+        if value_cells:
+            n_rows = int(value_cells[-1][1])  # rows are checked to be in order below
+            n_cols = max(column_index_from_string(c.decode()) for c in {col for col, _ in value_cells})
+    else:
+        data_end = data.end()
+    if any(a > b for a, b in zip(numbers, numbers[1:])):
+        return None
+    return SheetIndex(xml, p, root.group(0), numbers, offsets, data_end, n_rows, n_cols,
+                      sheet_name, sheetnames, parser_args)
+
+
+def _has_value(value) -> bool:
+    return value is not None and value != ""
+
+
+def _estimate_size(rows: List[List[Any]]) -> int:
+    """Rough in-memory footprint of a window (list overhead + each value)."""
+    total = sys.getsizeof(rows)
+    for row in rows:
+        total += sys.getsizeof(row)
+        for v in row:
+            if v is not None:
+                total += sys.getsizeof(v)
+    return total
+
+
+class SheetSnapshotCache:
+    """LRU cache of parsed sheet windows and snapshots, bounded by an approximate byte budget."""
+
+    def __init__(self, max_bytes: int = SNAPSHOT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple, Tuple[List[List[Any]], int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _file_key(path: str) -> Tuple[str, int, int]:
+        st = os.stat(path)
+        return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+    def window(self, path: str, max_rows: int = 200, max_cols: int = 50,
+               sheet_name: Optional[str] = None) -> List[List[Any]]:
+        """Same as read_sheet_window, served from memory while the file is unchanged.
+        The returned rows are shared; callers must not modify them."""
+        key = self._file_key(path) + ("window", sheet_name, max_rows, max_cols)
+        return self._get_or_load(key, lambda: read_sheet_window(
+            path, max_rows=max_rows, max_cols=max_cols, sheet_name=sheet_name), _estimate_size)
+
+    def page(self, path: str, row_start: int, row_count: int, col_start: int = 1, col_count: int = 50,
+             sheet_name: Optional[str] = None) -> SheetPage:
+        """Header row plus rows [row_start, row_start + row_count) of one column window (1-based),
+        from the sheet's row index (built once per file version, then reused for every page)."""
+        return self.index(path, sheet_name).page(row_start, row_count, col_start, col_count)
+
+    def index(self, path: str, sheet_name: Optional[str] = None):
+        """SheetIndex of one sheet; one over the budget is still returned, just not kept."""
+        key = self._file_key(path) + ("index", sheet_name)
+        return self._get_or_load(key, lambda: read_sheet_index(path, sheet_name=sheet_name),
+                                 lambda index: index.size)
+
+    def _get_or_load(self, key, load, size_of):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        value = load()
+        size = size_of(value)
+        with self._lock:
+            self.misses += 1
+            # A newer version of this file makes older entries dead weight
+            for old in [k for k in self._entries if k[0] == key[0] and k[1:3] != key[1:3]]:
+                self._bytes -= self._entries.pop(old)[1]
+            if size <= self.max_bytes and key not in self._entries:
+                self._entries[key] = (value, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    _, (_, evicted) = self._entries.popitem(last=False)
+                    self._bytes -= evicted
+        return value
+
+    def discard(self, path: str) -> None:
+        """Drop every cached window of one file (e.g. when its session goes away)."""
+        abspath = os.path.abspath(path)
+        with self._lock:
+            for old in [k for k in self._entries if k[0] == abspath]:
+                self._bytes -= self._entries.pop(old)[1]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes,
+                    "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
+
+
+# Shared process-wide cache used by backend/server.py
+snapshot_cache = SheetSnapshotCache()
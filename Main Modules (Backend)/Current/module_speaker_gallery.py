@@ -0,0 +1,70 @@
+# module_speaker_gallery.py
+# Enrolled speaker embeddings as one matrix for module_speaker_id.
+# Every row is L2-normalized once when the gallery is built, so identifying a
+# voice is a single matrix-vector product (one BLAS call) plus an argmax,
+# instead of a Python loop that re-normalizes each profile per lookup.
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+EPS = 1e-10
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Unit-length float32 copy of a vector or of each row of a matrix."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / (norms + EPS)
+
+
+class SpeakerGallery:
+    """Names plus a contiguous (n_speakers, dim) float32 matrix of unit embeddings."""
+
+    def __init__(self, names: Iterable[str], embeddings):
+        self.names: List[str] = list(names)
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.size == 0:
+            matrix = matrix.reshape(0, matrix.shape[-1] if matrix.ndim == 2 else 0)
+        if matrix.ndim != 2 or len(self.names) != matrix.shape[0]:
+            raise ValueError("embeddings must be one row per name")
+        self.matrix = np.ascontiguousarray(normalize(matrix))
+        self._rows: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+
+    @classmethod
+    def from_store(cls, store) -> "SpeakerGallery":
+        """Build from a ProfileStore (names() and matrix() in the same row order)."""
+        return cls(store.names(), store.matrix())
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._rows
+
+    def update(self, name: str, embedding: np.ndarray) -> None:
+        """Replace one known speaker's row in place."""
+        self.matrix[self._rows[name]] = normalize(embedding)
+
+    def similarities(self, query: np.ndarray) -> np.ndarray:
+        """Cosine similarity of the query to every enrolled speaker."""
+        return self.matrix @ normalize(query)
+
+    def identify(self, query: np.ndarray) -> Tuple[Optional[str], float]:
+        """Best match -> (name, similarity); (None, 0.0) if nobody is enrolled."""
+        if not self.names:
+            return None, 0.0
+        sims = self.similarities(query)
+        best = int(np.argmax(sims))
+        return self.names[best], float(sims[best])
+
+    def top_k(self, query: np.ndarray, k: int = 3) -> List[Tuple[str, float]]:
+        """The k most similar speakers, best first."""
+        if not self.names or k <= 0:
+            return []
+        sims = self.similarities(query)
+        k = min(k, len(self.names))
+        # argpartition finds the k best in O(n); only those k get sorted
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return [(self.names[i], float(sims[i])) for i in top]
@@ -6,29 +6,35 @@
 © 2025 Shreyas | Student of Sathyabama Institute of Science and Technology
 
 import os
-import json
+import threading
 import time
 import Levenshtein
 from pathlib import Path
-from typing import Dict, Tuple, Optional, List
+from typing import Tuple, Optional, List
 
 import numpy as np
 import sounddevice as sd
 import soundfile as sf
 from resemblyzer import VoiceEncoder, preprocess_wav
 
+from module_speaker_gallery import SpeakerGallery
+from module_profile_store import ProfileStore, migrate_legacy
+
 # ----------------------------
 # Config & paths
 # ----------------------------
 DATA_DIR = Path("data")
 AUDIO_DIR = DATA_DIR / "audio_samples"
-EMB_DIR = DATA_DIR / "embeddings"
-PROFILE_JSON = DATA_DIR / "voice_profiles.json"
+EMB_DIR = DATA_DIR / "embeddings"            # legacy per-sample embeddings (read once by the migration)
+PROFILE_JSON = DATA_DIR / "voice_profiles.json"  # legacy profiles (read once by the migration)
+PROFILE_DIR = DATA_DIR / "profiles"           # ProfileStore: index.json + embedding matrix
 
 SAMPLE_RATE = 16000     # Record at 16kHz (matches encoder expectations well)
 CHANNELS = 1
 DEFAULT_DURATION = 3.0  # seconds per enrollment sample
 DEFAULT_THRESHOLD = 0.65  # cosine similarity threshold (0..1). Lowered for better recognition.
+# Clips are embedded straight from memory; set SPEAKER_AUDIT_AUDIO=1 to also keep them as WAVs
+AUDIT_AUDIO = os.environ.get("SPEAKER_AUDIT_AUDIO", "").lower() in ("1", "true", "yes")
 
 # ----------------------------
 # Ensure directories exist
@@ -41,26 +47,57 @@ def _ensure_dirs():
 # ----------------------------
 # Storage helpers
 # ----------------------------
-def load_profiles() -> Dict:
-    _ensure_dirs()
-    if PROFILE_JSON.exists():
-        with open(PROFILE_JSON, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {"version": 1, "sample_rate": SAMPLE_RATE, "users": {}}
-
-def save_profiles(db: Dict) -> None:
-    _ensure_dirs()
-    with open(PROFILE_JSON, "w", encoding="utf-8") as f:
-        json.dump(db, f, indent=2)
+# Process-wide cache: the store stays open (a stat() per use notices other processes'
+# writes) and the gallery is rebuilt only when the store's write generation moves.
+_profile_lock = threading.RLock()
+_profile_store: Optional[ProfileStore] = None
+_gallery_cache: Optional[Tuple[int, SpeakerGallery]] = None
+
+def load_profiles() -> ProfileStore:
+    """The cached profile store; the first time, import voice_profiles.json and data/embeddings."""
+    global _profile_store
+    with _profile_lock:
+        root = PROFILE_DIR.resolve()
+        if _profile_store is not None and _profile_store.root == root:
+            _profile_store.refresh()
+            return _profile_store
+        _ensure_dirs()
+        first_use = not ProfileStore.exists(root)
+        store = ProfileStore(root, sample_rate=SAMPLE_RATE)
+        if first_use:
+            added = migrate_legacy(store, PROFILE_JSON, EMB_DIR)
+            if added:
+                print(f"📦 Migrated {added} voice profile(s) to {PROFILE_DIR}")
+        _profile_store = store
+        return store
+
+def load_gallery() -> SpeakerGallery:
+    """Cached SpeakerGallery of every enrolled speaker."""
+    global _gallery_cache
+    with _profile_lock:
+        store = load_profiles()
+        if _gallery_cache is None or _gallery_cache[0] != store.generation:
+            _gallery_cache = (store.generation, SpeakerGallery.from_store(store))
+        return _gallery_cache[1]
+
+def _store_embedding(name: str, emb: np.ndarray, **counts) -> None:
+    """Write one speaker's profile, patching the cached gallery row instead of rebuilding it."""
+    global _gallery_cache
+    with _profile_lock:
+        store = load_profiles()
+        gallery_current = _gallery_cache is not None and _gallery_cache[0] == store.generation
+        store.put(name, emb, **counts)
+        if gallery_current and name in _gallery_cache[1]:
+            _gallery_cache[1].update(name, emb)
+            _gallery_cache = (store.generation, _gallery_cache[1])
 
 def list_users() -> List[str]:
-    return sorted(load_profiles().get("users", {}).keys())
+    return sorted(load_profiles().names())
 
 def remove_user(name: str) -> bool:
-    db = load_profiles()
-    if name in db["users"]:
-        del db["users"][name]
-        save_profiles(db)
+    with _profile_lock:
+        removed = load_profiles().remove(name)
+    if removed:
         # Optional: also remove audio/embedding files
         for d in [AUDIO_DIR / name, EMB_DIR / name]:
             if d.exists():
@@ -71,7 +108,8 @@ def remove_user(name: str) -> bool:
     return False
 
 def reset_profiles() -> None:
-    save_profiles({"version": 1, "sample_rate": SAMPLE_RATE, "users": {}})
+    with _profile_lock:
+        load_profiles().clear()
     # Optionally wipe files:
     for root in [AUDIO_DIR, EMB_DIR]:
         if root.exists():
@@ -107,18 +145,19 @@ def _resolve_input_device(device: Optional[int] = None, name_hint: Optional[str]
     return None
 
 
-def record_wav(path: Path, duration: float = DEFAULT_DURATION, samplerate: int = SAMPLE_RATE,
-               device: Optional[int] = None, silence_threshold: float = 0.01, name_hint: Optional[str] = None) -> bool:
+def record_audio(duration: float = DEFAULT_DURATION, samplerate: int = SAMPLE_RATE,
+                 device: Optional[int] = None, silence_threshold: float = 0.01,
+                 name_hint: Optional[str] = None) -> Optional[np.ndarray]:
     """
-    Record microphone audio to WAV.
-    Returns True if audio above threshold was captured, False otherwise.
+    Record microphone audio into memory.
+    Returns the mono float32 samples, or None if nothing above threshold was captured.
     """
 
     # Auto-pick input device if not provided
     resolved = _resolve_input_device(device=device, name_hint=name_hint)
     if resolved is None:
         print("❌ No valid input devices found. Check microphone connection.")
-        return False
+        return None
     device = resolved
     devices = sd.query_devices()
     print(f"🎤 Using input device: {devices[device]['name']} (index={device})")
@@ -138,29 +177,86 @@ def record_wav(path: Path, duration: float = DEFAULT_DURATION, samplerate: int =
             sd.wait()
         except Exception as e2:
             print(f"❌ Recording failed: {e2}")
-            return False
+            return None
 
     # Check for silence
     max_amp = np.max(np.abs(audio))
     if max_amp < silence_threshold:
         print("⚠️ Silence detected. Recording not saved.")
-        return False
+        return None
+    return audio.reshape(-1)
 
+def save_audio(path: Path, audio: np.ndarray, samplerate: int = SAMPLE_RATE) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
     sf.write(str(path), audio, samplerate)
     print(f"✅ Saved: {path}")
+
+def _audit_audio(path: Path, audio: np.ndarray) -> None:
+    """Keep a copy of a clip only when AUDIT_AUDIO is on."""
+    if AUDIT_AUDIO:
+        save_audio(path, audio)
+
+def record_wav(path: Path, duration: float = DEFAULT_DURATION, samplerate: int = SAMPLE_RATE,
+               device: Optional[int] = None, silence_threshold: float = 0.01, name_hint: Optional[str] = None) -> bool:
+    """
+    Record microphone audio to WAV.
+    Returns True if audio above threshold was captured, False otherwise.
+    """
+    audio = record_audio(duration=duration, samplerate=samplerate, device=device,
+                         silence_threshold=silence_threshold, name_hint=name_hint)
+    if audio is None:
+        return False
+    save_audio(path, audio, samplerate)
     return True
+
 # ----------------------------
 # Embeddings
 # ----------------------------
 _encoder_singleton: Optional[VoiceEncoder] = None
+_encoder_lock = threading.Lock()
+_warmup_status = {"state": "idle", "seconds": None, "error": None}
+_warmup_thread: Optional[threading.Thread] = None
 
 def _get_encoder() -> VoiceEncoder:
     global _encoder_singleton
-    if _encoder_singleton is None:
-        _encoder_singleton = VoiceEncoder()  # will use CPU; if you have GPU, it’ll use it automatically if available
+    # A request that arrives during warm-up waits for that load instead of starting another
+    with _encoder_lock:
+        if _encoder_singleton is None:
+            _encoder_singleton = VoiceEncoder()  # will use CPU; if you have GPU, it’ll use it automatically if available
     return _encoder_singleton
 
+def warm_up_encoder() -> bool:
+    """Load the encoder and run one dummy inference, so the first real identification
+    doesn't pay for model loading and PyTorch's first-call setup. Returns True when ready."""
+    _warmup_status.update(state="loading", error=None)
+    started = time.time()
+    try:
+        encoder = _get_encoder()
+        # One second of faint noise: long enough for a full partial window
+        noise = np.random.default_rng(0).normal(0, 0.01, SAMPLE_RATE).astype(np.float32)
+        encoder.embed_utterance(noise)
+        load_gallery()  # profiles too, so the first lookup is a cache hit
+    except Exception as e:
+        _warmup_status.update(state="failed", error=str(e), seconds=round(time.time() - started, 2))
+        print(f"⚠️ Voice encoder warm-up failed: {e}")
+        return False
+    _warmup_status.update(state="ready", seconds=round(time.time() - started, 2))
+    print(f"✅ Voice encoder ready ({_warmup_status['seconds']}s)")
+    return True
+
+def start_encoder_warmup() -> threading.Thread:
+    """Run warm_up_encoder() on a background thread (once per process)."""
+    global _warmup_thread
+    with _profile_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=warm_up_encoder, name="encoder-warmup", daemon=True)
+            _warmup_thread.start()
+        return _warmup_thread
+
+def encoder_status() -> dict:
+    """{"state": idle|loading|ready|failed, "seconds", "error"} for health checks."""
+    return dict(_warmup_status)
+
 def embed_wav_file(wav_path: Path) -> np.ndarray:
     """
     Convert a wav file to a speaker embedding vector (np.ndarray, shape ~(256,)).
@@ -170,6 +266,14 @@ def embed_wav_file(wav_path: Path) -> np.ndarray:
     emb = encoder.embed_utterance(wav)  # shape (256,)
     return emb.astype(np.float32)
 
+def embed_audio(audio: np.ndarray, samplerate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Speaker embedding straight from recorded samples (no WAV round-trip).
+    """
+    wav = preprocess_wav(audio, source_sr=samplerate)  # same normalization as for files
+    encoder = _get_encoder()
+    return encoder.embed_utterance(wav).astype(np.float32)
+
 def cosine_sim(a: np.ndarray, b: np.ndarray) -> float:
     a = a / (np.linalg.norm(a) + 1e-10)
     b = b / (np.linalg.norm(b) + 1e-10)
@@ -192,9 +296,6 @@ def enroll_user(name: str, samples: int = 1, duration: float = DEFAULT_DURATION,
     print(f"📝 Enrolling '{name}' with {samples} sample(s)…")
 
     audio_dir = AUDIO_DIR / name
-    emb_dir = EMB_DIR / name
-    audio_dir.mkdir(parents=True, exist_ok=True)
-    emb_dir.mkdir(parents=True, exist_ok=True)
 
     embeddings = []
     i = 0  # counter for attempts
@@ -204,11 +305,10 @@ def enroll_user(name: str, samples: int = 1, duration: float = DEFAULT_DURATION,
     while len(embeddings) < samples:
         i += 1
         ts = time.strftime("%Y%m%d-%H%M%S")
-        wav_path = audio_dir / f"{ts}-{i}.wav"
-        
+
         # Record audio and check if non-silent
-        success = record_wav(wav_path, duration=duration, device=device)
-        if not success:
+        audio = record_audio(duration=duration, device=device)
+        if audio is None:
             consecutive_silent += 1
             print(f"⚠️ Sample {i} skipped due to silence. (Attempt {consecutive_silent}/{max_silent_attempts})")
             if consecutive_silent >= max_silent_attempts:
@@ -218,22 +318,16 @@ def enroll_user(name: str, samples: int = 1, duration: float = DEFAULT_DURATION,
         consecutive_silent = 0  # reset on valid sample
 
         # Create embedding for valid audio
-        emb = embed_wav_file(wav_path)
+        emb = embed_audio(audio)
         embeddings.append(emb)
-        np.save(emb_dir / f"{ts}-{i}.npy", emb)
+        _audit_audio(audio_dir / f"{ts}-{i}.wav", audio)
 
     # Compute average embedding
     avg_emb = average_embeddings(embeddings)
 
-    # Save profile
-    db = load_profiles()
-    db["users"][name] = {
-        "embedding": avg_emb.tolist(),
-        "samples": samples,
-        "updated_at": time.strftime("%Y-%m-%d %H:%M:%S")
-    }
-    save_profiles(db)
-    print(f"✅ Enrollment complete for '{name}'. Profiles updated at {PROFILE_JSON}")
+    # Save profile (one row written in place, or appended)
+    _store_embedding(name, avg_emb, samples=samples)
+    print(f"✅ Enrollment complete for '{name}'. Profiles updated at {PROFILE_DIR}")
 
 def _fuzzy_match_name(spoken_name: str, known_names: list, threshold: float = 0.65) -> Optional[str]:
     """
@@ -255,31 +349,26 @@ def identify_current_speaker(duration: float = DEFAULT_DURATION, device: Optiona
     Record a short clip, embed it, compare to saved profiles, and return (best_name, similarity).
     If no match above threshold, returns ("Unknown", best_similarity).
     """
-    ts = time.strftime("%Y%m%d-%H%M%S")
-    wav_path = AUDIO_DIR / f"whoami-{ts}.wav"
-    
     # Record audio
-    success = record_wav(wav_path, duration=duration, device=device, name_hint=name_hint)
-    if not success:
+    audio = record_audio(duration=duration, device=device, name_hint=name_hint)
+    if audio is None:
         print("⚠️ No valid audio captured. Returning Unknown.")
         return "Unknown", 0.0  # Exit gracefully if silent
-    
-    # Proceed only if recording succeeded
-    query_emb = embed_wav_file(wav_path)
 
-    db = load_profiles()
-    users = db.get("users", {})
-    if not users:
+    # Proceed only if recording succeeded; embedded from memory, nothing written
+    query_emb = embed_audio(audio)
+    _audit_audio(AUDIO_DIR / f"whoami-{time.strftime('%Y%m%d-%H%M%S')}.wav", audio)
+
+    gallery = load_gallery()
+    if not len(gallery):
         print("⚠️ No profiles found. Please enroll a user first.")
         return "Unknown", 0.0
 
-    best_name, best_sim = "Unknown", 0.0
-    for name, meta in users.items():
-        ref = np.array(meta["embedding"], dtype=np.float32)
-        sim = cosine_sim(query_emb, ref)
+    # One matrix-vector product over every enrolled speaker
+    for name, sim in gallery.top_k(query_emb, k=3):
         print(f"   • similarity({name}) = {sim:.3f}")
-        if sim > best_sim:
-            best_name, best_sim = name, sim
+    best_name, best_sim = gallery.identify(query_emb)
+    best_sim = max(best_sim, 0.0)
 
     if best_sim >= threshold:
         print(f"✅ Recognized as '{best_name}' (similarity={best_sim:.3f} ≥ {threshold})")
@@ -336,22 +425,11 @@ if __name__ == "__main__":
 # === Add to module_speaker_id.py ===
 
 def _load_user_embedding(name: str) -> Optional[np.ndarray]:
-    db = load_profiles()
-    meta = db.get("users", {}).get(name)
-    if not meta:
-        return None
-    return np.array(meta["embedding"], dtype=np.float32)
+    return load_profiles().get(name)
 
 def _save_user_embedding(name: str, emb: np.ndarray, samples_inc: int = 1) -> None:
-    db = load_profiles()
-    if "users" not in db:
-        db["users"] = {}
-    rec = db["users"].get(name, {"samples": 0})
-    rec["embedding"] = emb.astype(np.float32).tolist()
-    rec["samples"] = int(rec.get("samples", 0)) + samples_inc
-    rec["updated_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
-    db["users"][name] = rec
-    save_profiles(db)
+    # Rewrites only this speaker's row, not every profile
+    _store_embedding(name, emb, samples_inc=samples_inc)
 
 def ema_update(old_emb: np.ndarray, new_emb: np.ndarray, alpha: float = 0.2) -> np.ndarray:
     """Exponential moving average for gentle adaptation over time."""
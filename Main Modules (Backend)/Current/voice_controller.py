@@ -120,7 +120,7 @@ def api_voice_command():
 
         # Save after execution
         try:
-            excel.wb.save(excel.filename)
+            excel.flush()
             result["steps"]["saved"] = True
         except Exception as e:
             result["save_error"] = str(e)
@@ -80,6 +80,161 @@ def test_excel_operations():
             os.unlink(temp_path)
         print("🧹 Cleaned up test file")
 
+def test_write_behind_save():
+    """Test that edits are written once per flush instead of on every update"""
+    print("\n🧪 Testing Write-Behind Save...")
+
+    with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as tmp_file:
+        temp_path = tmp_file.name
+
+    try:
+        wb = ExcelHandler(temp_path)
+        wb.ws['A1'] = 'Student Name'
+        wb.ws['B1'] = 'DSA'
+        wb.save()
+
+        wb.add_student_if_not_exists('Priya')
+        wb.update_cell_value('Priya', 'DSA', 95)
+        print(f"Dirty after edits: {wb.dirty}")
+
+        wrote = wb.flush()
+        print(f"First flush wrote file: {wrote}")
+        print(f"Second flush wrote file: {wb.flush()}")
+
+        reopened = ExcelHandler(temp_path)
+        print(f"Priya's DSA score on disk: {reopened.ws['B2'].value}")
+
+    except Exception as e:
+        print(f"❌ Error during testing: {e}")
+        import traceback
+        traceback.print_exc()
+
+    finally:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+
+def test_similar_names_stay_separate():
+    """Test that a new name that only sounds like an existing one gets its own row"""
+    print("\n🧪 Testing Similar-Sounding Names...")
+
+    with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as tmp_file:
+        temp_path = tmp_file.name
+
+    try:
+        wb = ExcelHandler(temp_path)
+        wb.ws['A1'] = 'Student Name'
+        wb.ws['B1'] = 'DSA'
+        wb.ws['A2'] = 'Aman'
+        wb.ws['B2'] = 70
+        wb.invalidate_index()
+
+        parse_command("add 99 for Amin in DSA", wb)
+        print(f"Aman's DSA score (expect 70): {wb.ws['B2'].value}")
+        print(f"Amin's row (expect 3): {wb.find_student_row('Amin')}")
+        print(f"Amin's DSA score (expect 99): {wb.ws['B3'].value}")
+
+    except Exception as e:
+        print(f"❌ Error during testing: {e}")
+        import traceback
+        traceback.print_exc()
+
+    finally:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+
+def test_phonetic_name_lookup():
+    """Test that a name matched through its Soundex bucket skips the full roster scan"""
+    print("\n🧪 Testing Phonetic Name Lookup...")
+    from module_name_matcher import NameMatcher
+
+    roster = ['priya', 'christina'] + [f'student{i}' for i in range(1000)]
+    matcher = NameMatcher(roster)
+    scanned = []
+    score_in = matcher._best_in
+    matcher._best_in = lambda query, choices, threshold: scanned.append(len(choices)) or score_in(query, choices, threshold)
+
+    print(f"'pria' resolved to (expect priya): {matcher.best('pria')}")
+    print(f"Choices scored (expect [1]): {scanned}")
+    scanned.clear()
+    print(f"'kristina' resolved to (expect christina): {matcher.best('kristina')}")
+    print(f"Choices scored without a bucket match (expect [{len(roster)}]): {scanned}")
+
+def test_cell_edit_patches():
+    """Test that a conflicting or invalid patch leaves the sheet untouched"""
+    print("\n🧪 Testing Cell Edit Patches...")
+
+    with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as tmp_file:
+        temp_path = tmp_file.name
+
+    try:
+        wb = ExcelHandler(temp_path)
+        wb.ws['A1'] = 'Student Name'
+        wb.ws['B1'] = 'DSA'
+        wb.ws['A2'] = 'Priya'
+        wb.ws['B2'] = 1
+        wb.save()
+
+        conflicts = wb.apply_cell_edits([{'cell': 'B2', 'old': 1, 'new': 5},
+                                         {'cell': 'A2', 'old': 'Someone', 'new': 'x'}])
+        print(f"Conflicts reported: {len(conflicts)}, B2 (expect 1): {wb.ws['B2'].value}")
+
+        try:
+            wb.apply_cell_edits([{'cell': 'B2', 'old': 1, 'new': 5}, {'cell': 'A0', 'new': 'x'}])
+            print("❌ Bad cell was accepted")
+        except ValueError as e:
+            print(f"Rejected bad cell: {e}")
+        print(f"B2 (expect 1): {wb.ws['B2'].value}, dirty (expect False): {wb.dirty}")
+
+        print(f"Valid patch conflicts: {wb.apply_cell_edits([{'cell': 'B2', 'old': 1, 'new': 5}])}")
+        print(f"B2 (expect 5): {wb.ws['B2'].value}")
+
+    except Exception as e:
+        print(f"❌ Error during testing: {e}")
+        import traceback
+        traceback.print_exc()
+
+    finally:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+
+def test_batch_commands():
+    """Test running several text commands as one batch edit"""
+    print("\n🧪 Testing Batch Commands...")
+    from module_batch_commands import run_batch
+
+    with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as tmp_file:
+        temp_path = tmp_file.name
+
+    try:
+        wb = ExcelHandler(temp_path)
+        wb.ws['A1'] = 'Student Name'
+        wb.ws['B1'] = 'DSA'
+        wb.ws['A2'] = 'Priya'
+        wb.ws['B2'] = 50
+        wb.save()
+
+        result = run_batch(wb, ["add 80 for Priya in DSA",
+                                "subtract 5 for Priya in DSA",
+                                "add 70 for Rahul in DSA"])
+        print(f"Applied (expect 3): {result['applied']}, failed (expect 0): {result['failed']}")
+        print(f"Priya's DSA (expect 75): {wb.ws['B2'].value}")
+        print(f"Rahul added in row (expect 3): {wb.find_student_row('Rahul')}, DSA (expect 70): {wb.ws['B3'].value}")
+        wb.flush()
+
+        result = run_batch(wb, ["add 99 for Priya in DSA", "add 10 for Priya in Chemistry"], atomic=True)
+        print(f"Atomic batch applied (expect 0): {result['applied']}, failed (expect 1): {result['failed']}")
+        print(f"Priya's DSA (expect 75): {wb.ws['B2'].value}, dirty (expect False): {wb.dirty}")
+        print(f"Flush after rejected batch wrote file (expect False): {wb.flush()}")
+
+    except Exception as e:
+        print(f"❌ Error during testing: {e}")
+        import traceback
+        traceback.print_exc()
+
+    finally:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+
 def test_command_parsing():
     """Test command parsing functionality"""
     print("\n🧪 Testing Command Parsing...")
@@ -129,6 +284,11 @@ if __name__ == "__main__":
     
     test_app_folder_creation()
     test_excel_operations()
+    test_write_behind_save()
+    test_similar_names_stay_separate()
+    test_phonetic_name_lookup()
+    test_cell_edit_patches()
+    test_batch_commands()
     test_command_parsing()
     
     print("\n" + "=" * 60)